@@ -1,4 +1,4 @@
-import sys
+import argparse
 
 from src.config import CONFIG_FILE, get_config
 from src.post_scrape import run_post_scrape
@@ -11,10 +11,13 @@ sys.argv = [
     'job3.json'
 ]'''
 
+ARG_PARSER = argparse.ArgumentParser(description='Scrape websites as configured in a job file.')
+ARG_PARSER.add_argument('config_file', nargs='?', default=CONFIG_FILE, help=f'job file to run (default: {CONFIG_FILE})')
+
 if __name__ == '__main__':
-    config_file = CONFIG_FILE if len(sys.argv) == 1 else sys.argv[1]
+    args = ARG_PARSER.parse_args()
 
-    config = get_config(file=config_file)
+    config = get_config(file=args.config_file)
 
     if not config.post_scrape_jobs_only:
         scrape(config)
@@ -1,13 +1,18 @@
-import json
+import re
+import stat
+from dataclasses import dataclass, field
 from enum import Flag, auto, Enum
+from functools import partial, lru_cache
 from pathlib import Path
-from typing import List
+from typing import List, Optional, TYPE_CHECKING, NamedTuple, Callable, Any, Tuple, Pattern
 
-from selenium.webdriver.common.by import By
+import orjson
 
 from src.util.generic import log, LogType
-from src.util.json_util import json_parse, json_parse_enum, json_parse_class_list
-from src.util.selenium_util import UIElement, UITask
+from src.util.json_util import json_parse, json_parse_enum, json_parse_class_list, parse_enum, JSON_MISSING
+
+if TYPE_CHECKING:
+    from src.util.selenium_util import UIElement
 
 CONFIG_FILE = 'job.json'
 CONFIG_VAL_COOKIES = 'cookies'
@@ -21,11 +26,14 @@ CONFIG_VAL_OUT_DIR = 'out_dir'
 CONFIG_VAL_SCRAPE_TYPE = 'scrape_type'
 CONFIG_VAL_SCRAPE_ELEMENTS = 'scrape_elements'
 CONFIG_VAL_SCRAPE_SITEMAP = 'scrape_sitemap'
+CONFIG_VAL_SCRAPE_PRIORITY = 'scrape_priority'
 CONFIG_VAL_URLS = 'urls'
 CONFIG_VAL_USER_AGENT = 'user_agent'
 CONFIG_VAL_IFRAME_IGNORE = 'iframe_ignore'
 CONFIG_VAL_POST_SCRAPE_JOBS = 'post_scrape_jobs'
 CONFIG_VAL_POST_SCRAPE_JOBS_ONLY = 'post_scrape_jobs_only'
+CONFIG_VAL_DOWNLOAD_WORKERS = 'download_workers'
+CONFIG_VAL_PAGE_WORKERS = 'page_workers'
 
 CONFIG_VAL_CONTENT_NAME = 'content_name'
 CONFIG_VAL_CONTENT_NAME_ID = 'id'
@@ -53,112 +61,125 @@ class ScrapeType(Enum):
     ALL_PAGES = 1
 
 
+@dataclass(frozen=True)
 class IFrameIgnore:
-    def __init__(self, identifier: str, obj_type: str):
-        self.identifier = identifier
-        self.obj_type = obj_type
-
-    def __repr__(self):
-        return str(self.__dict__)
+    identifier: str
+    obj_type: str
 
 
 class PostScrapeJobType(Enum):
     REPLACE = 'REPLACE'
 
 
+@dataclass(frozen=True)
 class PostScrapeJob:
-    def __init__(self, obj_type: PostScrapeJobType, identifier: str, text: str):
-        self.obj_type = obj_type
-        self.identifier = identifier
-        self.text = text
-
-    def __repr__(self):
-        return str(self.__dict__)
+    obj_type: PostScrapeJobType
+    identifier: str
+    text: str
 
 
+@dataclass(frozen=True)
 class Login:
-    def __init__(self, url: str, children: List[UIElement]):
-        self.url = url
-        self.children = children
+    url: str
+    children: List['UIElement']
 
-    def __repr__(self):
-        return str(self.__dict__)
 
+class Cookie(NamedTuple):
+    name: str = ''
+    value: str = ''
+    domain: str = ''
+    path: str = ''
+    secure: Optional[bool] = None
+    http_only: Optional[bool] = None
+    expiry: Optional[int] = None
+    same_site: Optional[str] = None
 
-class Cookie:
-    def __init__(self, dictionary: dict = None, name: str = '', value: str = '', domain: str = '', path: str = ''):
-        self.name = name
-        self.value = value
-        self.domain = domain
-        self.path = path
+    def is_valid(self) -> bool:
+        return bool(self.name and self.value and self.domain and self.path)
 
-        if dictionary:
-            for key in dictionary:
-                setattr(self, key, dictionary[key])
+    def get_optional_fields(self, expiry_key: str) -> dict:
+        optional = {'secure': self.secure, 'httpOnly': self.http_only, expiry_key: self.expiry, 'sameSite': self.same_site}
 
-        if not self.name or not self.value or not self.domain or not self.path:
-            log(f'Invalid Cookie', log_type=LogType.ERROR)
+        return {key: val for key, val in optional.items() if val is not None}
 
-    def __repr__(self):
-        return str(self.__dict__)
+    def to_webdriver_dict(self) -> dict:
+        return {'name': self.name, 'value': self.value, 'domain': self.domain, 'path': self.path, **self.get_optional_fields('expiry')}
 
+    def to_cdp_dict(self) -> dict:
+        return {'name': self.name, 'value': self.value, 'domain': self.domain, 'path': self.path, **self.get_optional_fields('expires')}
+
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> 'Cookie':
+        return cls(
+            dictionary.get('name', ''),
+            dictionary.get('value', ''),
+            dictionary.get('domain', dictionary.get('host', '')),
+            dictionary.get('path', ''),
+            dictionary.get('secure'),
+            dictionary.get('httpOnly'),
+            dictionary.get('expiry', dictionary.get('expires')),
+            dictionary.get('sameSite')
+        )
 
-class ContentName:
-    def __init__(self, identifier: str, prefix=''):
-        self.identifier = identifier
-        self.prefix = prefix
 
-    def __repr__(self):
-        return str(self.__dict__)
+@dataclass(frozen=True)
+class ContentName:
+    identifier: str
+    prefix: str = ''
 
 
+@dataclass(frozen=True)
 class Config:
     """
     Get cookies from Firefox's 'cookies.sqlite' using:
         SELECT json_group_array(cookie) FROM (SELECT json_object('name', name, 'value', value, 'host', host, 'path',
             path) as cookie FROM moz_cookies where host like '%host%')
     """
-    def __init__(self, scrape_type: ScrapeType, urls: List[str] = None, out_dir: str = None, cookies: List[Cookie] = None, content_name: ContentName = None,
-                 user_agent: str = None, login: Login = None, scrape_elements: ScrapeElements = None, scrape_sitemap: bool = True,
-                 data_directory: str = 'data', substrings_to_skip: List[str] = None, scroll_pause_time: float = 1.0, min_timeout: float = 5.0,
-                 max_timeout: float = 10.0, cache_completed_urls: bool = True, iframe_ignore: List[IFrameIgnore] = None,
-                 post_scrape_jobs: List[PostScrapeJob] = None, post_scrape_jobs_only: bool = False):
-        self.scrape_type = scrape_type
-        self.urls: List[str] = [] if urls is None else urls
-        self.out_dir = out_dir
-        self.cookies: List[Cookie] = [] if cookies is None else cookies
-        self.content_name = content_name
-        self.user_agent = user_agent
-        self.login = login
-        self.scrape_elements = scrape_elements
-        self.scrape_sitemap = scrape_sitemap
-        self.data_directory = data_directory
-        self.substrings_to_skip = substrings_to_skip
-        self.scroll_pause_time = scroll_pause_time
-        self.min_timeout = min_timeout
-        self.max_timeout = max_timeout
-        self.cache_completed_urls = cache_completed_urls
-        self.iframe_ignore: List[IFrameIgnore] = [] if iframe_ignore is None else iframe_ignore
-        self.post_scrape_jobs: List[PostScrapeJob] = [] if post_scrape_jobs is None else post_scrape_jobs
-        self.post_scrape_jobs_only = post_scrape_jobs_only
-
-    def __repr__(self):
-        return str(self.__dict__)
-
-
-def parse_content_name(obj) -> ContentName:
-    content_name = None
-    content_name_obj = json_parse(obj, CONFIG_VAL_CONTENT_NAME)
-    if content_name_obj:
-        identifier = json_parse(content_name_obj, CONFIG_VAL_CONTENT_NAME_ID, fatal=True)
-        prefix = json_parse(content_name_obj, CONFIG_VAL_CONTENT_NAME_PREFIX)
-
-        content_name = ContentName(identifier, prefix)
-
-    return content_name
-
-
-def parse_ui_element(obj):
+    scrape_type: ScrapeType = None
+    urls: List[str] = field(default_factory=list)
+    out_dir: str = None
+    cookies: List[Cookie] = field(default_factory=list)
+    content_name: ContentName = None
+    user_agent: str = None
+    login: Login = None
+    scrape_elements: ScrapeElements = None
+    scrape_sitemap: bool = True
+    scrape_priority: bool = False
+    data_directory: str = 'data'
+    substrings_to_skip: List[str] = None
+    scroll_pause_time: float = 1.0
+    min_timeout: float = 5.0
+    max_timeout: float = 10.0
+    cache_completed_urls: bool = True
+    iframe_ignore: List[IFrameIgnore] = field(default_factory=list)
+    post_scrape_jobs: List[PostScrapeJob] = field(default_factory=list)
+    post_scrape_jobs_only: bool = False
+    download_workers: int = 8
+    page_workers: int = 1
+    substrings_to_skip_pattern: Optional[Pattern] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        pattern = None
+        if self.substrings_to_skip:
+            pattern = re.compile('|'.join(re.escape(substring) for substring in self.substrings_to_skip))
+
+        object.__setattr__(self, 'substrings_to_skip_pattern', pattern)
+
+
+def parse_content_name(content_name_obj) -> Optional[ContentName]:
+    if not content_name_obj:
+        return None
+
+    identifier = json_parse(content_name_obj, CONFIG_VAL_CONTENT_NAME_ID, fatal=True)
+    prefix = json_parse(content_name_obj, CONFIG_VAL_CONTENT_NAME_PREFIX)
+
+    return ContentName(identifier, prefix)
+
+
+def parse_ui_element(obj) -> 'UIElement':
+    from selenium.webdriver.common.by import By
+    from src.util.selenium_util import UIElement, UITask
+
     identifier = json_parse(obj, CONFIG_VAL_LOGIN_ELEMENT_ID, fatal=True)
     value = json_parse(obj, CONFIG_VAL_LOGIN_ELEMENT_VALUE, default=None)
     task: UITask = json_parse_enum(obj, CONFIG_VAL_LOGIN_ELEMENT_TASK, UITask)
@@ -167,63 +188,100 @@ def parse_ui_element(obj):
     return UIElement(identifier, ui_type, value=value, task=task)
 
 
-def parse_login(obj) -> Login:
-    login = None
-    login_obj = json_parse(obj, CONFIG_VAL_LOGIN)
-    if login_obj:
-        url = json_parse(login_obj, CONFIG_VAL_LOGIN_URL, fatal=True)
+def parse_login(login_obj) -> Optional[Login]:
+    if not login_obj:
+        return None
+
+    url = json_parse(login_obj, CONFIG_VAL_LOGIN_URL, fatal=True)
+    children_obj = json_parse(login_obj, CONFIG_VAL_LOGIN_CHILDREN, fatal=True)
+    children = [parse_ui_element(child_obj) for child_obj in children_obj]
+
+    return Login(url, children)
+
+
+def parse_cookies(cookies_obj) -> List[Cookie]:
+    cookies = list(map(Cookie.from_dict, cookies_obj))
 
-        children = []
-        children_obj = json_parse(login_obj, CONFIG_VAL_LOGIN_CHILDREN, fatal=True)
-        for child_obj in children_obj:
-            child = parse_ui_element(child_obj)
+    invalid_cookies = [cookie for cookie in cookies if not cookie.is_valid()]
+    if invalid_cookies:
+        log(f'Invalid Cookie: {invalid_cookies}', log_type=LogType.ERROR)
 
-            children.append(child)
+    return cookies
 
-        login = Login(url, children)
 
-    return login
+def parse_worker_count(workers_obj, key: str) -> int:
+    if not isinstance(workers_obj, int) or isinstance(workers_obj, bool) or workers_obj < 1:
+        log(f'Invalid {key}: {workers_obj}, must be an integer of at least 1', log_type=LogType.ERROR)
+
+    return workers_obj
+
+
+class ConfigField(NamedTuple):
+    attr: str
+    key: str
+    parse: Optional[Callable[[Any], Any]] = None
+    fatal: bool = False
+
+
+CONFIG_FIELDS: Tuple[ConfigField, ...] = (
+    ConfigField('scrape_type', CONFIG_VAL_SCRAPE_TYPE, partial(parse_enum, class_type=ScrapeType)),
+    ConfigField('scrape_elements', CONFIG_VAL_SCRAPE_ELEMENTS, partial(parse_enum, class_type=ScrapeElements), fatal=True),
+    ConfigField('scrape_sitemap', CONFIG_VAL_SCRAPE_SITEMAP),
+    ConfigField('scrape_priority', CONFIG_VAL_SCRAPE_PRIORITY),
+    ConfigField('urls', CONFIG_VAL_URLS),
+    ConfigField('out_dir', CONFIG_VAL_OUT_DIR),
+    ConfigField('user_agent', CONFIG_VAL_USER_AGENT),
+    ConfigField('data_directory', CONFIG_VAL_DATA_DIRECTORY),
+    ConfigField('substrings_to_skip', CONFIG_VAL_SUBSTRINGS_TO_SKIP),
+    ConfigField('scroll_pause_time', CONFIG_VAL_SCROLL_PAUSE_TIME),
+    ConfigField('min_timeout', CONFIG_VAL_MIN_TIMEOUT),
+    ConfigField('max_timeout', CONFIG_VAL_MAX_TIMEOUT),
+    ConfigField('cache_completed_urls', CONFIG_VAL_CACHE_COMPLETED_URLS),
+    ConfigField('content_name', CONFIG_VAL_CONTENT_NAME, parse_content_name),
+    ConfigField('login', CONFIG_VAL_LOGIN, parse_login),
+    ConfigField('cookies', CONFIG_VAL_COOKIES, parse_cookies),
+    ConfigField('iframe_ignore', CONFIG_VAL_IFRAME_IGNORE, partial(json_parse_class_list, class_type=IFrameIgnore)),
+    ConfigField('post_scrape_jobs_only', CONFIG_VAL_POST_SCRAPE_JOBS_ONLY),
+    ConfigField('post_scrape_jobs', CONFIG_VAL_POST_SCRAPE_JOBS, partial(json_parse_class_list, class_type=PostScrapeJob)),
+    ConfigField('download_workers', CONFIG_VAL_DOWNLOAD_WORKERS, partial(parse_worker_count, key=CONFIG_VAL_DOWNLOAD_WORKERS)),
+    ConfigField('page_workers', CONFIG_VAL_PAGE_WORKERS, partial(parse_worker_count, key=CONFIG_VAL_PAGE_WORKERS)),
+)
 
 
 def json_to_config(obj) -> Config:
-    scrape_type: ScrapeType = json_parse_enum(obj, CONFIG_VAL_SCRAPE_TYPE, ScrapeType)
-    scrape_elements: ScrapeElements = json_parse_enum(obj, CONFIG_VAL_SCRAPE_ELEMENTS, ScrapeElements, fatal=True)
-    scrape_sitemap: bool = json_parse(obj, CONFIG_VAL_SCRAPE_SITEMAP, default=True)
-    urls = json_parse(obj, CONFIG_VAL_URLS, default=List[str])
-    out_dir = json_parse(obj, CONFIG_VAL_OUT_DIR, default=None)
-    user_agent = json_parse(obj, CONFIG_VAL_USER_AGENT, default=None)
-    data_directory: str = json_parse(obj, CONFIG_VAL_DATA_DIRECTORY, default='data')
-    substrings_to_skip: List[str] = json_parse(obj, CONFIG_VAL_SUBSTRINGS_TO_SKIP, default=None)
-    scroll_pause_time: float = json_parse(obj, CONFIG_VAL_SCROLL_PAUSE_TIME, default=1.0)
-    min_timeout: float = json_parse(obj, CONFIG_VAL_MIN_TIMEOUT, default=5.0)
-    max_timeout: float = json_parse(obj, CONFIG_VAL_MAX_TIMEOUT, default=10.0)
-    cache_completed_urls: bool = json_parse(obj, CONFIG_VAL_CACHE_COMPLETED_URLS, default=True)
-    content_name = parse_content_name(obj)
-    login = parse_login(obj)
+    kwargs = {}
+    for attr, key, parse, fatal in CONFIG_FIELDS:
+        val = obj.get(key, JSON_MISSING)
 
-    cookies_obj = json_parse(obj, CONFIG_VAL_COOKIES, default={})
-    cookies = [Cookie(dictionary=cookie) for cookie in cookies_obj]
+        if val is JSON_MISSING:
+            if fatal:
+                log(f'Cannot find {key} in {obj}.', log_type=LogType.ERROR)
 
-    iframe_ignore = json_parse_class_list(obj, IFrameIgnore, key=CONFIG_VAL_IFRAME_IGNORE, default=[])
+            continue
 
-    post_scrape_jobs_only: bool = json_parse(obj, CONFIG_VAL_POST_SCRAPE_JOBS_ONLY, default=False)
-    post_scrape_jobs: List[PostScrapeJob] = json_parse_class_list(obj, PostScrapeJob, key=CONFIG_VAL_POST_SCRAPE_JOBS, default=[])
+        kwargs[attr] = parse(val) if parse else val
 
-    config = Config(scrape_type, urls=urls, cookies=cookies, out_dir=out_dir, content_name=content_name, user_agent=user_agent, login=login,
-                    scrape_elements=scrape_elements, scrape_sitemap=scrape_sitemap, data_directory=data_directory, substrings_to_skip=substrings_to_skip,
-                    scroll_pause_time=scroll_pause_time, min_timeout=min_timeout, max_timeout=max_timeout, cache_completed_urls=cache_completed_urls,
-                    iframe_ignore=iframe_ignore, post_scrape_jobs=post_scrape_jobs, post_scrape_jobs_only=post_scrape_jobs_only)
+    return Config(**kwargs)
 
-    return config
+
+@lru_cache(maxsize=8)
+def load_config(file: str, mtime_ns: int, size: int) -> Config:
+    with open(file, 'rb') as file_obj:
+        json_obj = orjson.loads(file_obj.read())
+
+    return json_to_config(json_obj)
 
 
 def get_config(file=CONFIG_FILE):
-    config_file = Path(file)
-    if not config_file.is_file():
-        log(f'{file} not found in path', log_type=LogType.ERROR)
+    config_file = Path(file).resolve()
 
-    with open(file, 'r') as file_obj:
-        text = ''.join(file_obj.readlines())
-        json_obj = json.loads(text)
+    try:
+        file_stat = config_file.stat()
+    except OSError:
+        file_stat = None
+
+    if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+        log(f'{file} not found in path', log_type=LogType.ERROR)
+        return None
 
-        return json_to_config(json_obj)
+    return load_config(str(config_file), file_stat.st_mtime_ns, file_stat.st_size)
@@ -1,6 +1,8 @@
-import json
+import re
+from dataclasses import dataclass, field
 from typing import Optional, List
 
+import orjson
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.remote.webelement import WebElement
 
@@ -8,58 +10,62 @@ from src.iframe.iframe import IFrameHandler
 from src.scrape_classes import ScrapeJob, ScrapeJobType, ScrapeJobTask
 from src.util.generic import first_or_none
 from src.util.io import DuplicateHandler
-from src.util.json_util import json_parse, json_parse_class_list, json_parse_class_list_with_items
+from src.util.json_util import json_parse, json_parse_path, json_parse_class_list, json_parse_class_list_with_items
+from src.util.selenium_util import find_script_text
 from src.util.web.generic import extract_json_from_text, download_file, DownloadedFileResult, get_filename_from_url
 from src.util.web.stream_download import download_stream
 
 
+def parse_quality_number(quality: str) -> int:
+    # Only the leading digits are the resolution, '1080p60' is 1080 at 60 fps
+    match = re.match(r'\d+', quality)
+
+    return int(match.group()) if match else 0
+
+
+@dataclass
 class VimeoIFrameRequestFilesProgressive:
-    def __init__(self, width: int, height: int, mime: str, fps: int, url: str, quality: str):
-        self.width = width
-        self.height = height
-        self.mime = mime
-        self.fps = fps
-        self.url = url
-        self.quality = quality
+    width: int
+    height: int
+    mime: str
+    fps: int
+    url: str
+    quality: str
+    _quality_num: int = field(init=False, repr=False)
 
-    def get_quality_number(self):
-        val = int(first_or_none(filter(str.isdigit, self.quality)))
-        return val
+    def __post_init__(self):
+        self._quality_num = parse_quality_number(self.quality)
 
-    def __repr__(self):
-        return str(self.__dict__)
+    def get_quality_number(self) -> int:
+        return self._quality_num
 
 
+@dataclass
 class VimeoIFrameRequestFilesDashCDNStream:
-    def __init__(self, identifier: int, quality: str, fps: int):
-        self.identifier = identifier
-        self.quality = quality
-        self.fps = fps
+    identifier: int
+    quality: str
+    fps: int
+    _quality_num: int = field(init=False, repr=False)
 
-    def get_quality_number(self):
-        val = int(first_or_none(filter(str.isdigit, self.quality)))
-        return val
+    def __post_init__(self):
+        self._quality_num = parse_quality_number(self.quality)
 
-    def __repr__(self):
-        return str(self.__dict__)
+    def get_quality_number(self) -> int:
+        return self._quality_num
 
 
+@dataclass
 class VimeoIFrameRequestFilesDashCDN:
-    def __init__(self, name: str, url: str, avc_url: str):
-        self.name = name
-        self.url = url
-        self.avc_url = avc_url
-
-    def __repr__(self):
-        return str(self.__dict__)
+    name: str
+    url: str
+    avc_url: str
 
 
+@dataclass
 class VimeoIFrameRequestFilesDash:
-    def __init__(self, streams: List[VimeoIFrameRequestFilesDashCDNStream], cdns: List[VimeoIFrameRequestFilesDashCDN],
-                 streams_avc: List[VimeoIFrameRequestFilesDashCDNStream]):
-        self.streams = streams
-        self.cdns = cdns
-        self.streams_avc = streams_avc
+    streams: List[VimeoIFrameRequestFilesDashCDNStream]
+    cdns: List[VimeoIFrameRequestFilesDashCDN]
+    streams_avc: List[VimeoIFrameRequestFilesDashCDNStream]
 
     def best(self) -> VimeoIFrameRequestFilesDashCDNStream:
         return VimeoIFrameRequestFilesDash.best_impl(self.streams)
@@ -72,41 +78,27 @@ class VimeoIFrameRequestFilesDash:
 
     @staticmethod
     def best_impl(lst: List[VimeoIFrameRequestFilesDashCDNStream]) -> VimeoIFrameRequestFilesDashCDNStream:
-        in_order = sorted(lst, key=lambda x: x.get_quality_number(), reverse=True)
-        return first_or_none(in_order)
-
-    def __repr__(self):
-        return str(self.__dict__)
+        return max(lst, key=lambda x: x.get_quality_number(), default=None)
 
 
+@dataclass
 class VimeoIFrameRequestFiles:
-    def __init__(self, dash: VimeoIFrameRequestFilesDash, progressive: List[VimeoIFrameRequestFilesProgressive]):
-        self.dash = dash
-        self.progressive = progressive
+    dash: VimeoIFrameRequestFilesDash
+    progressive: List[VimeoIFrameRequestFilesProgressive]
 
     def best_progressive(self) -> VimeoIFrameRequestFilesProgressive:
-        in_order = sorted(self.progressive, key=lambda x: x.get_quality_number(), reverse=True)
-        return first_or_none(in_order)
-
-    def __repr__(self):
-        return str(self.__dict__)
+        return max(self.progressive, key=lambda x: x.get_quality_number(), default=None)
 
 
+@dataclass
 class VimeoIFrameRequest:
-    def __init__(self, files: VimeoIFrameRequestFiles):
-        self.files = files
-
-    def __repr__(self):
-        return str(self.__dict__)
+    files: VimeoIFrameRequestFiles
 
 
+@dataclass
 class VimeoIFrameScript:
-    def __init__(self, request: VimeoIFrameRequest, referer: str):
-        self.request = request
-        self.referer = referer
-
-    def __repr__(self):
-        return str(self.__dict__)
+    request: VimeoIFrameRequest
+    referer: str
 
 
 class VimeoIFrameHandler(IFrameHandler):
@@ -116,8 +108,7 @@ class VimeoIFrameHandler(IFrameHandler):
         return src and 'player.vimeo' in src
 
     def handle(self, driver: WebDriver) -> List[ScrapeJob]:
-        scripts = [script.get_attribute('innerHTML') for script in driver.find_elements_by_tag_name('script')]
-        script = first_or_none(scripts, lambda element: 'player.vimeo.com' in element)
+        script = find_script_text(driver, 'player.vimeo.com')
 
         file = VimeoIFrameHandler.download_file_from_js(script)
 
@@ -128,7 +119,7 @@ class VimeoIFrameHandler(IFrameHandler):
     @staticmethod
     def download_file_from_js(txt: str, check_progressive_first: bool = True):
         json_str = extract_json_from_text(txt)
-        json_obj = json.loads(json_str)
+        json_obj = orjson.loads(json_str)
 
         script = VimeoIFrameHandler.parse_json(json_obj)
 
@@ -149,8 +140,7 @@ class VimeoIFrameHandler(IFrameHandler):
 
     @staticmethod
     def parse_json(json_obj) -> VimeoIFrameScript:
-        request_json = json_parse(json_obj, 'request', fatal=True)
-        request_files_json = json_parse(request_json, 'files', fatal=True)
+        request_files_json = json_parse_path(json_obj, 'request', 'files', fatal=True)
         request_files_dash_json = json_parse(request_files_json, 'dash', fatal=True)
         request_files_dash_streams_json = json_parse(request_files_dash_json, 'streams', fatal=True)
         request_files_dash_cdns_json = json_parse(request_files_dash_json, 'cdns', fatal=True)
@@ -167,7 +157,7 @@ class VimeoIFrameHandler(IFrameHandler):
         request_files = VimeoIFrameRequestFiles(dash, progressive)
         request = VimeoIFrameRequest(request_files)
 
-        referer = json_parse(request_json, 'referrer', fatal=True)
+        referer = json_parse_path(json_obj, 'request', 'referrer', fatal=True)
 
         script = VimeoIFrameScript(request, referer)
 
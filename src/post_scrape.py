@@ -1,18 +1,45 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
+from typing import List, Tuple
 
 from src.config import Config, PostScrapeJobType
 from src.util.io import scan_directory
 
+POST_SCRAPE_CHUNK_SIZE = 16
+# Below this many files, starting worker processes costs more than rewriting the files in this one
+POST_SCRAPE_PROCESS_MIN_FILES = 64
+# Scraped HTML is written as UTF-8 without a BOM, so the identifiers have to be encoded the same way to match
+POST_SCRAPE_ENCODING = 'utf-8'
+
+
+def rewrite_file(file: str, replacements: List[Tuple[bytes, bytes]]):
+    file_obj = Path(file)
+    original_data = file_obj.read_bytes()
+
+    data = original_data
+    for identifier, text in replacements:
+        data = data.replace(identifier, text)
+
+    if data == original_data:
+        return
+
+    file_obj.write_bytes(data)
+
+
+def run_post_scrape(config: Config):
+    replacements = [(job.identifier.encode(POST_SCRAPE_ENCODING), job.text.encode(POST_SCRAPE_ENCODING)) for job in config.post_scrape_jobs
+                    if job.obj_type == PostScrapeJobType.REPLACE]
+    if not replacements:
+        return
 
-def run_post_scrape(config: Config, encoding: str = 'utf-8'):
     _, files = scan_directory(config.out_dir, [".html"])
 
-    for file in files:
-        file_obj = Path(file)
-        file_text = file_obj.read_text(encoding=encoding)
+    if len(files) < POST_SCRAPE_PROCESS_MIN_FILES:
+        for file in files:
+            rewrite_file(file, replacements)
 
-        for job in config.post_scrape_jobs:
-            if job.obj_type == PostScrapeJobType.REPLACE:
-                file_text = file_text.replace(job.identifier, job.text)
+        return
 
-        file_obj.write_text(file_text, encoding=encoding)
+    with ProcessPoolExecutor() as executor:
+        list(executor.map(partial(rewrite_file, replacements=replacements), files, chunksize=POST_SCRAPE_CHUNK_SIZE))
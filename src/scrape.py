@@ -1,30 +1,34 @@
 import random
-import shelve
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from functools import partial
 from math import floor
-from time import sleep
-from typing import List, Tuple, Optional
-from urllib.parse import urlparse, ParseResult
+from time import sleep, monotonic
+from typing import List, Tuple, Optional, Set, Dict, Iterator, Callable
 
 import filetype
 from selenium import webdriver
-from selenium.common.exceptions import NoSuchWindowException, NoSuchElementException
+from selenium.common.exceptions import NoSuchWindowException, WebDriverException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
-from src.config import Config, ScrapeType, ContentName, Cookie, UITask, ScrapeElements, IFrameIgnore
+from src.config import Config, ScrapeType, ContentName, Cookie, ScrapeElements, IFrameIgnore
 from src.iframe.iframe import IFrameHandler
 from src.iframe.vimeo import VimeoIFrameHandler
 from src.scrape_classes import ScrapeJob, ScrapeJobType, ScrapeJobTask
-from src.util.generic import name_of, distinct, any_list_in_str, first_or_none, replace_with_index, LogType
+from src.util.generic import name_of, first_or_none, replace_with_index, multi_replace, LogType
 from src.util.io import validate_path, write_file, DuplicateHandler, ensure_directory_exists, split_full_path, move_file_to_dir, append_to_file, \
     replace_invalid_path_characters
-from src.util.ordered_queue import OrderedSetQueue, QueueType
-from src.util.selenium_util import wait_page_load, get_ui_element, driver_go_and_wait, wait_page_redirect
+from src.util.ordered_queue import OrderedSet, OrderedSetQueue, QueueType
+from src.util.selenium_util import wait_page_load, get_ui_element, driver_go_and_wait, wait_page_redirect, get_elements_attribute, UITask
+from src.util.url_cache import URLCache
+from src.util.url_store import URLStore, URLState
 from src.util.web.generic import log, download_file, get_referer, get_origin, join_path, is_blank, DownloadedFileResult, GroupByMapping, GroupByPair, \
-    get_content_type, url_in_domain, find_urls_in_html_or_js, get_relative_path, url_in_list, url_is_relative, join_url, get_base_url, \
-    get_sub_directory_path, get_url_without_fragment
+    get_content_type, url_in_domain, find_urls_in_html_or_js, get_relative_path, get_url_key, url_in_list, url_is_relative, join_url, get_base_url, \
+    get_sub_directory_path, get_url_without_fragment, get_url_depth
 from src.util.web.html_parser import find_html_tag
 from src.util.web.sitemap_xml import SitemapXml
 from src.video.iframe import VideoHandler
@@ -32,9 +36,9 @@ from src.video.wistia import WistiaVideoHandler
 
 CHROME_DRIVER_LOC = 'res/chromedriver.exe'
 
-IGNORED_CONTENT_TYPES = [
+IGNORED_CONTENT_TYPES = frozenset([
     'text/html'
-]
+])
 
 DEFAULT_GROUP_BY = GroupByMapping(
     GroupByPair(['.js'], 'js'),
@@ -55,47 +59,77 @@ DEFAULT_IFRAME_HANDLERS = [
     VimeoIFrameHandler(),
 ]
 
+CACHE_URLS_FILE = 'cache/urls.sqlite'
 CACHE_COMPLETED_URLS_FILE = 'cache/completed_urls.db'
 CACHE_QUEUED_URLS_FILE = 'cache/queued_urls.db'
 
-NOT_HANDLED_VIDEOS = []
-NOT_HANDLED_IFRAMES = []
-ALREADY_LOGGED_DOWNLOADED_URLS = []
+URL_CACHES_LOCK = threading.Lock()
+URL_STORE: Optional[URLStore] = None
+URL_CACHES: Dict[URLState, URLCache] = {}
+
+DRIVER_LOCAL = threading.local()
+DRIVERS: List[WebDriver] = []
+DRIVERS_LOCK = threading.Lock()
+DRIVER_CREATE_RETRIES = 3
+
+NOT_HANDLED_VIDEOS: Set[str] = set()
+NOT_HANDLED_IFRAMES: Set[str] = set()
+ALREADY_LOGGED_DOWNLOADED_URLS: Set[str] = set()
+LOG_ONCE_LOCK = threading.Lock()
 
 MAX_RETRIES = 5
+PROGRESS_LOG_INTERVAL = 0.1
+# Below every negated sitemap priority (-1.0 to 0.0) so the start URL is always scraped first
+START_URL_PRIORITY = -2.0
+BRACE_TYPES = (('\'', '\''), ('"', '"'), ('(', ')'))
 
 
 def get_mapped_cookies(cookies: List[Cookie]):
-    domains = list(set([get_base_url(cookie.domain) for cookie in cookies]))
+    domains: Dict[str, List[Cookie]] = defaultdict(list)
+    for cookie in cookies:
+        domains[get_base_url(cookie.domain)].append(cookie)
+
+    return [(f'https://{domain}', elem) for domain, elem in domains.items()]
 
-    mapping = []
-    for domain in domains:
-        elem = [cookie for cookie in cookies if get_base_url(cookie.domain) == domain]
-        mapping.append((f'https://{domain}', elem))
 
-    return mapping
+def set_driver_cookies(driver: WebDriver, cookies: List[Cookie]):
+    # DevTools sets cookies for any domain in one call, WebDriver's add_cookie only works for the domain currently loaded
+    try:
+        driver.execute_cdp_cmd('Network.setCookies', {'cookies': [cookie.to_cdp_dict() for cookie in cookies]})
+        return
+    except WebDriverException as e:
+        log(e, extra='Could not set cookies through DevTools, falling back to visiting each domain', fatal=False, log_type=LogType.ERROR)
 
+    mapped_cookies = get_mapped_cookies(cookies)
 
-def scrape(config: Config):
+    for mapped_cookie in mapped_cookies:
+        driver.get(mapped_cookie[0])
+        wait_page_load(driver)
+
+        for cookie in mapped_cookie[1]:
+            driver.add_cookie(cookie.to_webdriver_dict())
+
+
+def create_driver(config: Config) -> WebDriver:
     options = Options()
     options.headless = False
 
     if not is_blank(config.user_agent):
         options.add_argument(f'user-agent={config.user_agent}')
 
-    driver = webdriver.Chrome(options=options, executable_path=CHROME_DRIVER_LOC)
+    driver = None
+    for attempt in range(1, DRIVER_CREATE_RETRIES + 1):
+        try:
+            driver = webdriver.Chrome(options=options, executable_path=CHROME_DRIVER_LOC)
+            break
+        except WebDriverException as e:
+            log(e, extra=f'Could not start Chrome (attempt {attempt}/{DRIVER_CREATE_RETRIES})', fatal=attempt == DRIVER_CREATE_RETRIES,
+                log_type=LogType.ERROR)
+            sleep(attempt)
 
     if len(config.cookies) > 0:
         log('Configuring cookies in Selenium.')
-        mapped_cookies = get_mapped_cookies(config.cookies)
-
-        for mapped_cookie in mapped_cookies:
-            driver.get(mapped_cookie[0])
-            wait_page_load(driver)
-
-            for cookie in mapped_cookie[1]:
-                cookie_dict = cookie.__dict__
-                driver.add_cookie(cookie_dict)
+        set_driver_cookies(driver, config.cookies)
 
     if config.login:
         log('Configuring login credentials in Selenium.')
@@ -116,42 +150,99 @@ def scrape(config: Config):
                     element.click()
                     wait_page_redirect(driver, old_url)
 
+    return driver
+
+
+def get_thread_driver(config: Config) -> WebDriver:
+    driver = getattr(DRIVER_LOCAL, 'driver', None)
+
+    if driver is None:
+        driver = create_driver(config)
+        DRIVER_LOCAL.driver = driver
+
+        with DRIVERS_LOCK:
+            DRIVERS.append(driver)
+
+    return driver
+
+
+def quit_drivers():
+    with DRIVERS_LOCK:
+        for driver in DRIVERS:
+            driver.quit()
+
+        DRIVERS.clear()
+
+
+def scrape(config: Config):
     ensure_directory_exists('/cache')
 
-    if config.scrape_type == ScrapeType.SINGLE_PAGE:
-        scrape_single_page(driver, config)
-    elif config.scrape_type == ScrapeType.ALL_PAGES:
-        for url in config.urls:
-            scrape_website(driver, config, url)
+    try:
+        with ThreadPoolExecutor(max_workers=config.page_workers) as executor:
+            if config.scrape_type == ScrapeType.SINGLE_PAGE:
+                scrape_single_page(executor, config)
+            elif config.scrape_type == ScrapeType.ALL_PAGES:
+                for url in config.urls:
+                    scrape_website(executor, config, url)
+    finally:
+        quit_drivers()
+        close_url_caches()
 
     log('All jobs completed!')
 
 
-def scrape_sitemap(base_url: str) -> List[str]:
+def scrape_sitemap(base_url: str) -> Dict[str, float]:
     sitemap = SitemapXml.parse_sitemap_by_url(base_url)
 
-    lst = []
-    for entry in sitemap.url_set:
-        lst.append(entry.url)
+    return {entry.url: entry.priority for entry in sitemap.url_set}
 
-    return lst
 
+def get_url_store() -> URLStore:
+    global URL_STORE
 
-def add_completed_url_to_cache(url: str, base_url: str):
-    with shelve.open(CACHE_COMPLETED_URLS_FILE, writeback=True) as url_cache:
-        lst: List[str] = url_cache.get(base_url, default=[])
+    with URL_CACHES_LOCK:
+        if URL_STORE is None:
+            URL_STORE = URLStore(CACHE_URLS_FILE)
 
-        if url not in lst:
-            lst.append(url)
+            if URL_STORE.created:
+                URL_STORE.import_shelve(CACHE_COMPLETED_URLS_FILE, URLState.COMPLETED)
+                URL_STORE.import_shelve(CACHE_QUEUED_URLS_FILE, URLState.QUEUED)
 
-        url_cache[base_url] = lst
+        return URL_STORE
 
 
-def is_url_completed(url: str, base_url: str):
-    with shelve.open(CACHE_COMPLETED_URLS_FILE, writeback=True) as url_cache:
-        lst: List[str] = url_cache.get(base_url, default=[])
+def get_url_cache(state: URLState) -> URLCache:
+    store = get_url_store()
+
+    with URL_CACHES_LOCK:
+        url_cache = URL_CACHES.get(state)
+
+        if url_cache is None:
+            url_cache = URL_CACHES[state] = URLCache(store, state)
+
+        return url_cache
 
-        return url in lst
+
+def close_url_caches():
+    global URL_STORE
+
+    with URL_CACHES_LOCK:
+        for url_cache in URL_CACHES.values():
+            url_cache.close()
+
+        URL_CACHES.clear()
+
+        if URL_STORE is not None:
+            URL_STORE.close()
+            URL_STORE = None
+
+
+def add_completed_url_to_cache(url: str, base_url: str):
+    get_url_cache(URLState.COMPLETED).add(url, base_url)
+
+
+def is_url_completed(url: str, base_url: str):
+    return get_url_cache(URLState.COMPLETED).contains(url, base_url)
 
 
 def get_non_cached_sites(urls: List[str], base_url: str, check_cache: bool = True) -> List[str]:
@@ -160,87 +251,101 @@ def get_non_cached_sites(urls: List[str], base_url: str, check_cache: bool = Tru
 
     base_url = get_base_url(base_url)
 
-    with shelve.open(CACHE_COMPLETED_URLS_FILE, writeback=True) as url_cache:
-        lst: List[str] = url_cache.get(base_url, default=[])
+    return get_url_cache(URLState.COMPLETED).filter_missing(urls, base_url)
 
-        return [url for url in urls if url not in lst]
 
-
-def process_queue(queue: OrderedSetQueue, driver: WebDriver, config: Config, base_url: str, send_queue: bool = True):
+def process_queue(queue: OrderedSetQueue, executor: ThreadPoolExecutor, config: Config, base_url: str, send_queue: bool = True):
     previously_queued_urls = get_queued_urls(base_url)
     queue.enqueue_list(previously_queued_urls)
 
     out_dir = config.out_dir.replace('\\', '/')
-    while not queue.empty():
-        url = queue.dequeue()
-        remove_queued_url(url, base_url)
+    completed_pages: Set[str] = set()
+    pending: Set[Future] = set()
+    while pending or not queue.empty():
+        # Only this thread dequeues; workers only enqueue, so empty() followed by dequeue() cannot block
+        while len(pending) < config.page_workers and not queue.empty():
+            url = queue.dequeue()
+            remove_queued_url(url, base_url)
+
+            if url_in_list(url, completed_pages):
+                continue
 
-        scrape_page(driver, config, url, base_url, out_dir, queue if send_queue else None)
+            completed_pages.add(get_url_key(url))
+            pending.add(executor.submit(scrape_page_with_thread_driver, config, url, base_url, out_dir, queue if send_queue else None, completed_pages))
 
-        if config.min_timeout or config.max_timeout:
-            timeout = floor(random.uniform(config.min_timeout, config.max_timeout))
-            sleep(timeout)
+        if not pending:
+            continue
 
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            future.result()
 
-def add_list_to_queue(queue: OrderedSetQueue, urls: List[str], base_url: str, config: Config):
-    for url in urls:
-        add_to_queue(queue, url, base_url)
 
+def scrape_page_with_thread_driver(config: Config, url: str, base_url: str, out_dir: str, queue: Optional[OrderedSetQueue], completed_pages: Set[str]):
+    driver = get_thread_driver(config)
 
-def add_to_queue(queue: OrderedSetQueue, url: str, base_url: str):
-    defragmented_url = get_url_without_fragment(url)
+    # The timeout spaces out page loads, so time spent scraping this page already counts towards it
+    deadline = None
+    if config.min_timeout or config.max_timeout:
+        deadline = monotonic() + floor(random.uniform(config.min_timeout, config.max_timeout))
 
-    if is_url_completed(defragmented_url, base_url):
-        return
+    scrape_page(driver, config, url, base_url, out_dir, queue, completed_pages=completed_pages)
 
-    queue.enqueue(defragmented_url)
+    if deadline:
+        sleep(max(deadline - monotonic(), 0))
 
-    with shelve.open(CACHE_QUEUED_URLS_FILE, writeback=True) as url_cache:
-        lst: List[str] = url_cache.get(base_url, default=[])
 
-        if defragmented_url not in lst:
-            lst.append(defragmented_url)
+def add_list_to_queue(queue: OrderedSetQueue, urls: List[str], base_url: str, config: Config, priorities: Dict[str, float] = None):
+    url_priorities: Dict[str, float] = {}
+    for url in urls:
+        url_priorities.setdefault(get_url_without_fragment(url), priorities.get(url, 0) if priorities else 0)
 
-        url_cache[base_url] = lst
+    defragmented_urls = get_url_cache(URLState.COMPLETED).filter_missing(url_priorities, base_url)
 
+    queue.enqueue_list(defragmented_urls, priorities=[url_priorities[url] for url in defragmented_urls])
+    get_url_cache(URLState.QUEUED).add_list(defragmented_urls, base_url)
 
-def remove_queued_url(url: str, base_url: str):
-    with shelve.open(CACHE_QUEUED_URLS_FILE, writeback=True) as url_cache:
-        lst: List[str] = url_cache.get(base_url, default=[])
 
-        if url in lst:
-            lst.remove(url)
+def add_to_queue(queue: OrderedSetQueue, url: str, base_url: str, priority: float = 0):
+    defragmented_url = get_url_without_fragment(url)
+
+    if is_url_completed(defragmented_url, base_url):
+        return
 
-        url_cache[base_url] = lst
+    queue.enqueue(defragmented_url, priority=priority)
+    get_url_cache(URLState.QUEUED).add(defragmented_url, base_url)
 
 
-def get_queued_urls(base_url: str):
-    with shelve.open(CACHE_QUEUED_URLS_FILE, writeback=True) as url_cache:
-        lst: List[str] = url_cache.get(base_url, default=[])
+def remove_queued_url(url: str, base_url: str):
+    get_url_cache(URLState.QUEUED).discard(url, base_url)
 
-        return lst
 
+def get_queued_urls(base_url: str) -> List[str]:
+    return get_url_cache(URLState.QUEUED).get(base_url)
 
-def scrape_website(driver: WebDriver, config: Config, base_url: str):
-    queue = OrderedSetQueue(queue_type=QueueType.FIFO)
-    add_to_queue(queue, base_url, base_url)
+
+def scrape_website(executor: ThreadPoolExecutor, config: Config, base_url: str):
+    queue = OrderedSetQueue(queue_type=QueueType.PRIORITY if config.scrape_priority else QueueType.FIFO)
+    add_to_queue(queue, base_url, base_url, priority=START_URL_PRIORITY)
 
     if config.scrape_sitemap:
         sitemap = scrape_sitemap(base_url)
-        non_cached_sites = get_non_cached_sites(sitemap, base_url, check_cache=config.cache_completed_urls)
+        non_cached_sites = get_non_cached_sites(list(sitemap), base_url, check_cache=config.cache_completed_urls)
 
-        add_list_to_queue(queue, non_cached_sites, base_url, config)
+        # Sitemap priorities go from 0.0 to 1.0 with 1.0 being the most important, negated so they are dequeued before the (depth based) discovered links
+        priorities = {url: -priority for url, priority in sitemap.items()}
+        add_list_to_queue(queue, non_cached_sites, base_url, config, priorities=priorities)
 
-    process_queue(queue, driver, config, base_url)
+    process_queue(queue, executor, config, base_url)
 
 
-def scrape_single_page(driver: WebDriver, config: Config):
+def scrape_single_page(executor: ThreadPoolExecutor, config: Config):
     queue = OrderedSetQueue(queue_type=QueueType.FIFO)
     for url in config.urls:
         base_url = get_base_url(url)
         add_to_queue(queue, url, base_url)
 
-    process_queue(queue, driver, config, '', send_queue=False)
+    process_queue(queue, executor, config, '', send_queue=False)
 
 
 def is_ignored_iframe(iframe_ignore_lst: List[IFrameIgnore], identifier: str = '') -> bool:
@@ -252,7 +357,7 @@ def is_ignored_iframe(iframe_ignore_lst: List[IFrameIgnore], identifier: str = '
 
 
 def scrape_page(driver: WebDriver, config: Config, url: str, base_url: str, out_dir: str, queue: Optional[OrderedSetQueue],
-                completed_pages: List[ParseResult] = None, iframe_handlers: List[IFrameHandler] = None, video_handlers: List[VideoHandler] = None):
+                completed_pages: Set[str] = None, iframe_handlers: List[IFrameHandler] = None, video_handlers: List[VideoHandler] = None):
     page_out_dir = get_sub_directory_path(base_url, url, prepend_dir=out_dir, append_slash=True)
     page_out_dir = replace_invalid_path_characters(page_out_dir)
     index_path = join_path(page_out_dir, filename='index.html')
@@ -260,77 +365,91 @@ def scrape_page(driver: WebDriver, config: Config, url: str, base_url: str, out_
     driver_go_and_wait(driver, url, config.scroll_pause_time)
 
     title = get_content_title(driver, content_name=config.content_name)
+    # Both are snapshotted once, every helper below reuses them instead of asking the driver again
+    page_html: str = driver.page_source
+    current_url = get_current_url(driver)
+    headers = get_default_headers(current_url, config.user_agent)
     downloaded_elements: List[ScrapeJob] = []
-    if config.scrape_elements & ScrapeElements.VIDEOS:
-        scrape_video_elements(downloaded_elements, config, driver, page_out_dir, title, video_handlers)
+    if completed_pages is None:
+        completed_pages = set()
 
-    if config.scrape_elements & ScrapeElements.IMAGES:
-        scrape_image_elements(downloaded_elements, config, driver, page_out_dir, title)
+    completed_pages.add(get_url_key(url))
 
-    if config.scrape_elements & ScrapeElements.HTML:
-        scrape_html_elements(downloaded_elements, config, driver, page_out_dir, title)
+    substrings_to_skip_pattern = config.substrings_to_skip_pattern
 
-    if config.scrape_elements & ScrapeElements.IFRAMES:
-        if not iframe_handlers:
-            iframe_handlers = DEFAULT_IFRAME_HANDLERS
+    relative_links = OrderedSet()
+    a_hrefs = OrderedSet()
+    with ThreadPoolExecutor(max_workers=config.download_workers) as executor:
+        # Downloads from every element type share one pool and are only awaited before store_html, so they overlap the Selenium work below
+        downloads = DownloadBatch(executor)
 
-        iframes = driver.find_elements_by_tag_name('iframe')
-        for iframe in iframes:
-            iframe_handler: IFrameHandler = first_or_none(iframe_handlers, lambda x: x.can_handle(iframe))
+        if config.scrape_elements & ScrapeElements.VIDEOS:
+            scrape_video_elements(downloaded_elements, downloads, config, driver, current_url, page_out_dir, title, video_handlers)
 
-            if not iframe_handler:
-                outer_html = iframe.get_attribute('outerHTML')
-                identifier = iframe.get_attribute('id')
+        if config.scrape_elements & ScrapeElements.IMAGES:
+            scrape_image_elements(downloads, config, driver, current_url, page_out_dir, title)
 
-                ignored_iframe = is_ignored_iframe(config.iframe_ignore, identifier=identifier)
+        if config.scrape_elements & ScrapeElements.HTML:
+            scrape_html_elements(downloaded_elements, downloads, config, current_url, headers, page_html, page_out_dir, title)
 
-                if identifier and not ignored_iframe and identifier not in NOT_HANDLED_IFRAMES:
-                    NOT_HANDLED_IFRAMES.append(identifier)
-                    append_to_file('cache/failed_iframes.txt', outer_html)
-                    log(f'IFRAME_ERROR: No handler for: {outer_html}')
+        if config.scrape_elements & ScrapeElements.IFRAMES:
+            if not iframe_handlers:
+                iframe_handlers = DEFAULT_IFRAME_HANDLERS
 
-                continue
+            iframes = driver.find_elements_by_tag_name('iframe')
+            for iframe in iframes:
+                iframe_handler: IFrameHandler = first_or_none(iframe_handlers, lambda x: x.can_handle(iframe))
 
-            driver.switch_to.frame(iframe)
-            wait_page_load(driver)
+                if not iframe_handler:
+                    outer_html = iframe.get_attribute('outerHTML')
+                    identifier = iframe.get_attribute('id')
 
-            iframe_jobs = iframe_handler.handle(driver)
+                    ignored_iframe = is_ignored_iframe(config.iframe_ignore, identifier=identifier)
 
-            driver.switch_to.default_content()
-            wait_page_load(driver)
+                    if identifier and not ignored_iframe and mark_first_occurrence(NOT_HANDLED_IFRAMES, identifier):
+                        append_to_file('cache/failed_iframes.txt', outer_html)
+                        log(f'IFRAME_ERROR: No handler for: {outer_html}')
 
-            handle_scrape_jobs(downloaded_elements, iframe_jobs, iframe, page_out_dir, config)
+                    continue
 
-    if not completed_pages:
-        completed_pages = []
+                driver.switch_to.frame(iframe)
+                wait_page_load(driver)
 
-    completed_pages.append(urlparse(url))
+                iframe_jobs = iframe_handler.handle(driver)
 
-    relative_links = []
-    a_hrefs = []
-    a_elements = driver.find_elements_by_tag_name('a')
-    for a_element in a_elements:
-        href = a_element.get_attribute('href')
+                driver.switch_to.default_content()
+                wait_page_load(driver)
 
-        if not href:
-            html = a_element.get_attribute('outerHTML')
-            log(f'A_ELEMENT: Could not handle: {html})')
-            continue
+                handle_scrape_jobs(downloaded_elements, iframe_jobs, iframe, page_out_dir, config)
 
-        if url_is_relative(href):
-            href = join_url(base_url, href)
+        # Pages often link the same URL many times, each one only needs a single content type lookup
+        hrefs = OrderedSet()
+        for href, html in get_elements_attribute(driver, 'a', 'href'):
+            if not href:
+                log(f'A_ELEMENT: Could not handle: {html})')
+                continue
 
-        content_type = get_content_type(href, headers=get_default_headers(driver.current_url, config.user_agent))
-        if content_type and content_type != 'text/html':
-            download_html_element(downloaded_elements, config, driver, href, href, page_out_dir, None)
-            continue
+            if url_is_relative(href):
+                href = join_url(base_url, href)
 
-        if url_in_domain(base_url, href):
-            if href not in relative_links:
-                relative_links.append(href)
+            hrefs.add(href)
+
+        # Content types are looked up concurrently; results come back in href order
+        content_types = executor.map(partial(get_content_type, headers=headers), hrefs)
+
+        for href, content_type in zip(hrefs, content_types):
+            if content_type and content_type != 'text/html':
+                downloads.submit(href, download_html_element, config, current_url, headers, href, href, page_out_dir, None)
+
+                continue
 
-            if href not in a_hrefs and not any_list_in_str(href, config.substrings_to_skip):
-                a_hrefs.append(href)
+            if url_in_domain(base_url, href):
+                relative_links.add(href)
+
+                if not (substrings_to_skip_pattern and substrings_to_skip_pattern.search(href)):
+                    a_hrefs.add(href)
+
+        downloaded_elements.extend(downloads.iter_completed())
 
     for relative_link in relative_links:
         sub_dir = get_sub_directory_path(base_url, relative_link, append_slash=False)
@@ -343,7 +462,7 @@ def scrape_page(driver: WebDriver, config: Config, url: str, base_url: str, out_
         downloaded_elements.append(scrape_job_relative)
         downloaded_elements.append(scrape_job_sub_dir)
 
-    store_html(driver, downloaded_elements, index_path)
+    store_html(page_html, downloaded_elements, index_path)
 
     if config.cache_completed_urls:
         add_completed_url_to_cache(url, base_url)
@@ -353,18 +472,15 @@ def scrape_page(driver: WebDriver, config: Config, url: str, base_url: str, out_
             if url_in_list(src_url, completed_pages):
                 continue
 
-            add_to_queue(queue, src_url, base_url)
+            add_to_queue(queue, src_url, base_url, priority=get_url_depth(src_url))
 
 
-def download_html_element(downloaded_elements: List[ScrapeJob], config: Config, driver: WebDriver, file_url: str, original_url: str, page_out_dir: str,
-                          ideal_filename: Optional[str]):
-    content_out_dir = join_path(page_out_dir, f'/{config.data_directory}')
-
-    headers = None
+def get_current_url(driver: WebDriver) -> str:
+    current_url = None
     retry = 0
-    while not headers and retry < MAX_RETRIES:
+    while not current_url and retry < MAX_RETRIES:
         try:
-            headers = get_default_headers(driver.current_url, config.user_agent)
+            current_url = driver.current_url
 
             retry = MAX_RETRIES
         except NoSuchWindowException:
@@ -375,29 +491,66 @@ def download_html_element(downloaded_elements: List[ScrapeJob], config: Config,
             if retry == MAX_RETRIES:
                 pass
 
+    return current_url
+
+
+class DownloadBatch:
+    def __init__(self, executor: ThreadPoolExecutor):
+        self.executor = executor
+        self.futures: List[Future] = []
+        self.urls: Set[str] = set()
+
+    def submit(self, url: str, fn: Callable[..., Optional[ScrapeJob]], *args):
+        # A URL repeated on the page (logos, sprites) is only downloaded once
+        if url in self.urls:
+            return
+
+        self.urls.add(url)
+        self.futures.append(self.executor.submit(fn, *args))
+
+    def iter_completed(self) -> Iterator[ScrapeJob]:
+        # Jobs are yielded in submission order so store_html sees the same order on every run
+        # Progress is repainted at most every PROGRESS_LOG_INTERVAL seconds rather than once per element
+        last_log = 0.0
+        for completed, future in enumerate(self.futures, start=1):
+            now = monotonic()
+            if now - last_log >= PROGRESS_LOG_INTERVAL or completed == len(self.futures):
+                log(f'Downloaded {completed}/{len(self.futures)} elements.', end='\r')
+                last_log = now
+
+            scrape_job = future.result()
+            if scrape_job:
+                yield scrape_job
+
+
+def download_html_element(config: Config, current_url: str, headers: List[Tuple[str, str]], file_url: str, original_url: str, page_out_dir: str,
+                          ideal_filename: Optional[str]) -> Optional[ScrapeJob]:
+    content_out_dir = join_path(page_out_dir, f'/{config.data_directory}')
+
     if get_content_type(file_url, headers=headers) == 'text/html':
-        return
+        return None
 
-    filename = download_element(driver.current_url, file_url, out_dir=content_out_dir, filename=ideal_filename, user_agent=config.user_agent,
-                                group_by=DEFAULT_GROUP_BY)
+    filename = download_element(current_url, file_url, out_dir=content_out_dir, filename=ideal_filename, user_agent=config.user_agent,
+                                group_by=DEFAULT_GROUP_BY, headers=headers)
 
     if not filename:
-        return
+        return None
 
     '''
     if filename.endswith('.js'):
         js_files.append(filename)
     '''
 
-    scrape_job = ScrapeJob(ScrapeJobTask.REPLACE, ScrapeJobType.URL, file_path=filename, url=original_url or file_url)
-    downloaded_elements.append(scrape_job)
+    return ScrapeJob(ScrapeJobTask.REPLACE, ScrapeJobType.URL, file_path=filename, url=original_url or file_url)
 
 
-def scrape_html_elements(downloaded_elements: List[ScrapeJob], config: Config, driver: WebDriver, page_out_dir: str, title: str):
+def scrape_html_elements(downloaded_elements: List[ScrapeJob], downloads: DownloadBatch, config: Config, current_url: str, headers: List[Tuple[str, str]],
+                         page_html: str, page_out_dir: str, title: str):
     # js_files = []
-    completed_urls = distinct([element.url for element in downloaded_elements])
-    urls = find_urls_in_html_or_js(str(driver.page_source))
+    completed_urls = downloads.urls.union(element.url for element in downloaded_elements)
+    urls = find_urls_in_html_or_js(page_html)
     urls = [(url, original_url) for url, original_url in urls if url not in completed_urls]
+
     for i in range(len(urls)):
         file_url, original_url = urls[i]
 
@@ -405,47 +558,50 @@ def scrape_html_elements(downloaded_elements: List[ScrapeJob], config: Config, d
         if title:
             ideal_filename = title + (f' - {i + 1}' if len(urls) > 1 else '')
 
-        download_html_element(downloaded_elements, config, driver, file_url, original_url, page_out_dir, ideal_filename)
-        '''
-        for js_file in js_files:
-            parse_js_urls(js_file, driver.current_url, content_out_dir, downloaded_elements, user_agent=config.user_agent, group_by=DEFAULT_GROUP_BY)
-        '''
+        downloads.submit(file_url, download_html_element, config, current_url, headers, file_url, original_url, page_out_dir, ideal_filename)
+
+    '''
+    for js_file in js_files:
+        parse_js_urls(js_file, current_url, content_out_dir, downloaded_elements, user_agent=config.user_agent, group_by=DEFAULT_GROUP_BY)
+    '''
 
 
-def scrape_image_elements(downloaded_elements: List[ScrapeJob], config: Config, driver: WebDriver, page_out_dir: str, title: str):
+def scrape_image_elements(downloads: DownloadBatch, config: Config, driver: WebDriver, current_url: str, page_out_dir: str, title: str):
     image_out_dir = join_path(page_out_dir, f'/{config.data_directory}/images')
-    elements = scrape_generic_content(driver, config, title, 'img', 'src', image_out_dir)
-    downloaded_elements.extend(elements)
+    scrape_generic_content(downloads, driver, config, current_url, title, 'img', 'src', image_out_dir)
 
 
-def scrape_video_elements(downloaded_elements: List[ScrapeJob], config: Config, driver: WebDriver, page_out_dir: str, title: str,
-                          video_handlers: List[VideoHandler] = None):
+def scrape_video_elements(downloaded_elements: List[ScrapeJob], downloads: DownloadBatch, config: Config, driver: WebDriver, current_url: str,
+                          page_out_dir: str, title: str, video_handlers: List[VideoHandler] = None):
     video_out_dir = join_path(page_out_dir, f'/{config.data_directory}/videos')
 
     tag_elements = driver.find_elements_by_tag_name('video')
-    for i in range(len(tag_elements)):
-        video = tag_elements[i]
-
+    sources = get_elements_attribute(driver, 'video', 'src', child_tag='source')
+    for i, (video, source) in enumerate(zip(tag_elements, sources)):
         # Direct link
-        try:
-            video.find_element_by_tag_name('source')  # Throws NoSuchElementException if not found
+        if source:
+            src_url, outer_html = source
+            if not src_url:
+                log(f'Could not find {name_of(src_url)}, skipping generic scrape on video. HTML: {outer_html}', fatal=False, log_type=LogType.ERROR)
+                continue
 
             ideal_filename = None
             if title:
                 ideal_filename = title + (f' - {i + 1}' if len(tag_elements) > 1 else '')
 
-            scrape_generic_element(driver, config, downloaded_elements, ideal_filename, 'video', 'src', video_out_dir, video, src_element='source')
-        except NoSuchElementException:
-            if not video_handlers:
-                video_handlers = DEFAULT_VIDEO_HANDLERS
+            downloads.submit(src_url, scrape_generic_url, current_url, config, ideal_filename, 'src', video_out_dir, src_url)
+            continue
 
-            video_handler: VideoHandler = first_or_none(video_handlers, lambda x: x.can_handle(video))
+        if not video_handlers:
+            video_handlers = DEFAULT_VIDEO_HANDLERS
 
-            if not video_handler:
-                continue
+        video_handler: VideoHandler = first_or_none(video_handlers, lambda x: x.can_handle(video))
 
-            video_jobs = video_handler.handle(driver, config)
-            handle_scrape_jobs(downloaded_elements, video_jobs, video, page_out_dir, config)
+        if not video_handler:
+            continue
+
+        video_jobs = video_handler.handle(driver, config)
+        handle_scrape_jobs(downloaded_elements, video_jobs, video, page_out_dir, config)
 
 
 def handle_scrape_jobs(downloaded_elements: List[ScrapeJob], jobs: List[ScrapeJob], element: WebElement, page_out_dir: str, config: Config):
@@ -512,124 +668,106 @@ def get_default_origin_headers(url: str) -> List[Tuple[str, str]]:
     ]
 
 
+def mark_first_occurrence(seen: Set[str], item: str) -> bool:
+    # Download and page workers share these sets, so the check and the add have to happen together
+    with LOG_ONCE_LOCK:
+        if item in seen:
+            return False
+
+        seen.add(item)
+        return True
+
+
 def download_element(current_url: str, src_url: str, out_dir: str = None, filename: str = None, user_agent: str = None, group_by: GroupByMapping = None,
-                     log_every_time: bool = False) \
+                     log_every_time: bool = False, headers: List[Tuple[str, str]] = None) \
         -> Optional[str]:
     full_path = None
 
     if out_dir:
         full_path = validate_path(out_dir)
 
-    headers = get_default_headers(current_url, user_agent)
+    if headers is None:
+        headers = get_default_headers(current_url, user_agent)
+
     downloaded_file = download_file(src_url, ideal_filename=filename, out_dir=full_path, headers=headers, duplicate_handler=DuplicateHandler.HASH_COMPARE,
                                     ignored_content_types=IGNORED_CONTENT_TYPES, group_by=group_by)
 
     if downloaded_file.result == DownloadedFileResult.SKIPPED:
-        if log_every_time or src_url not in ALREADY_LOGGED_DOWNLOADED_URLS:
+        if mark_first_occurrence(ALREADY_LOGGED_DOWNLOADED_URLS, src_url) or log_every_time:
             log(f'Skipped download {src_url}')
-            ALREADY_LOGGED_DOWNLOADED_URLS.append(src_url)
 
         return None
     elif downloaded_file.result == DownloadedFileResult.FAIL:
-        if log_every_time or src_url not in ALREADY_LOGGED_DOWNLOADED_URLS:
+        if mark_first_occurrence(ALREADY_LOGGED_DOWNLOADED_URLS, src_url) or log_every_time:
             log(f'Failed on download {src_url}', fatal=False, log_type=LogType.ERROR)
-            ALREADY_LOGGED_DOWNLOADED_URLS.append(src_url)
 
         return None
 
-    if log_every_time or src_url not in ALREADY_LOGGED_DOWNLOADED_URLS:
+    if mark_first_occurrence(ALREADY_LOGGED_DOWNLOADED_URLS, src_url) or log_every_time:
         log(f'Successfully downloaded {src_url}', fatal=False, log_type=LogType.INFO)
-        ALREADY_LOGGED_DOWNLOADED_URLS.append(src_url)
 
     return downloaded_file.filename
 
 
-def modify_url_for_replace(filename: str, url: str, types: List[str] = None) -> List[ScrapeJob]:
-    if types is None:
-        types = ['\'', '"', '()']
+def get_url_replacements(filename: str, url: str) -> List[Tuple[str, str]]:
+    return [(f'{start}{url}{end}', f'{start}{filename}{end}') for start, end in BRACE_TYPES]
 
-    lst = []
-    for brace_type in types:
-        start = None
-        end = None
-        if len(brace_type) == 1:
-            start = end = brace_type[0]
-        elif len(brace_type) == 2:
-            start = brace_type[0]
-            end = brace_type[1]
-        else:
-            log(f'Unsupported number of characters in type: {brace_type}', name_of(modify_url_for_replace), log_type=LogType.ERROR)
 
-        filename_new = f'{start}{filename}{end}'
-        url_new = f'{start}{url}{end}'
+def modify_url_for_replace(filename: str, url: str) -> List[ScrapeJob]:
+    return [ScrapeJob(ScrapeJobTask.REPLACE, ScrapeJobType.URL, file_path=f'{start}{filename}{end}', url=f'{start}{url}{end}') for start, end in BRACE_TYPES]
 
-        lst.append(ScrapeJob(ScrapeJobTask.REPLACE, ScrapeJobType.URL, file_path=filename_new, url=url_new))
-
-    return lst
-
-
-def store_html(driver: WebDriver, downloaded_elements: List[ScrapeJob], index_file: str):
-    html = str(driver.page_source)
 
+def store_html(html: str, downloaded_elements: List[ScrapeJob], index_file: str):
     out_dir, _ = split_full_path(index_file)
 
+    replacements: Dict[str, str] = {}
     for elem in downloaded_elements:
-        if elem.scrape_job_type == ScrapeJobType.URL:
-            if not elem.file_path:
-                continue
+        if elem.scrape_job_type != ScrapeJobType.URL or not elem.file_path:
+            continue
 
-            new_filename = get_relative_path(elem.file_path, out_dir)
+        new_filename = get_relative_path(elem.file_path, out_dir)
 
-            pairings = modify_url_for_replace(new_filename, elem.url)
-            for pairing in pairings:
-                html = html.replace(pairing.url, pairing.file_path)
-        elif elem.scrape_job_type == ScrapeJobType.VIDEO:
-            if not elem.file_path:
-                continue
+        for url_new, filename_new in get_url_replacements(new_filename, elem.url):
+            replacements.setdefault(url_new, filename_new)
 
-            new_filename = get_relative_path(elem.file_path, out_dir)
-            start, end = find_html_tag(By.ID, elem.identifier, html)
+    html = multi_replace(html, replacements)
 
-            replacement_html = elem.html.format(new_filename)
-            replaced_html = replace_with_index(html, replacement_html, start, end)
+    for elem in downloaded_elements:
+        if elem.scrape_job_type != ScrapeJobType.VIDEO or not elem.file_path:
+            continue
 
-            html = replaced_html
+        new_filename = get_relative_path(elem.file_path, out_dir)
+        start, end = find_html_tag(By.ID, elem.identifier, html)
 
-    write_file(index_file, html, encoding='utf-8')
+        replacement_html = elem.html.format(new_filename)
+        replaced_html = replace_with_index(html, replacement_html, start, end)
 
+        html = replaced_html
 
-def scrape_generic_content(driver: WebDriver, config: Config, title: str, tag: str, link_attribute: str, out_dir: str, src_element: str = None,
-                           group_by: GroupByMapping = None) -> List[ScrapeJob]:
-    downloaded_elements = []
+    write_file(index_file, html.encode('utf-8'))
 
-    tag_elements = driver.find_elements_by_tag_name(tag)
-    for i in range(len(tag_elements)):
-        ideal_filename = None
-        if title:
-            ideal_filename = title + (f' - {i + 1}' if len(tag_elements) > 1 else '')
 
-        scrape_generic_element(driver, config, downloaded_elements, ideal_filename, tag, link_attribute, out_dir, tag_elements[i], src_element, group_by)
+def scrape_generic_content(downloads: DownloadBatch, driver: WebDriver, config: Config, current_url: str, title: str, tag: str, link_attribute: str,
+                           out_dir: str, src_element: str = None, group_by: GroupByMapping = None):
+    tag_attributes = [pair for pair in get_elements_attribute(driver, tag, link_attribute, child_tag=src_element) if pair]
 
-    return downloaded_elements
+    total = len(tag_attributes)
+    numbered = title and total > 1
 
+    for i, (src_url, outer_html) in enumerate(tag_attributes):
+        if not src_url:
+            log(f'Could not find {name_of(src_url)}, skipping generic scrape on {tag}. HTML: {outer_html}', fatal=False, log_type=LogType.ERROR)
+            continue
 
-def scrape_generic_element(driver: WebDriver, config: Config, downloaded_elements: List[ScrapeJob], ideal_filename: str, tag: str, link_attribute: str,
-                           out_dir: str, original: WebElement, src_element: str = None, group_by: GroupByMapping = None):
-    source = original
-    if src_element:
-        source = original.find_element_by_tag_name(src_element)
+        ideal_filename = None
+        if title:
+            ideal_filename = f'{title} - {i + 1}' if numbered else title
 
-    src_url: str = source.get_attribute(link_attribute)
-    if not src_url:
-        outer_html = source.get_attribute('outerHTML')
-        tag_outer_html = original.get_attribute('outerHTML')
-        log(f'Could not find {name_of(src_url)}, skipping generic scrape on {tag}. HTML: {outer_html}, src_element: {src_element}, tag: {tag_outer_html}',
-            fatal=False, log_type=LogType.ERROR)
-        return
+        downloads.submit(src_url, scrape_generic_url, current_url, config, ideal_filename, link_attribute, out_dir, src_url, group_by)
 
-    log(f'Starting {link_attribute} download {src_url}.', end='\r')
 
-    filename = download_element(driver.current_url, src_url, out_dir=out_dir, filename=ideal_filename, user_agent=config.user_agent, group_by=group_by)
+def scrape_generic_url(current_url: str, config: Config, ideal_filename: str, link_attribute: str, out_dir: str, src_url: str,
+                       group_by: GroupByMapping = None) -> ScrapeJob:
+    filename = download_element(current_url, src_url, out_dir=out_dir, filename=ideal_filename, user_agent=config.user_agent, group_by=group_by)
 
-    scrape_job = ScrapeJob(ScrapeJobTask.REPLACE, ScrapeJobType.URL, file_path=filename, url=src_url)
-    downloaded_elements.append(scrape_job)
+    return ScrapeJob(ScrapeJobTask.REPLACE, ScrapeJobType.URL, file_path=filename, url=src_url)
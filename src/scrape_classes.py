@@ -11,6 +11,9 @@ class ScrapeJobTask(Enum):
 
 
 class ScrapeJob:
+    # Pages can produce thousands of jobs, so they skip the per-instance __dict__
+    __slots__ = ('task', 'scrape_job_type', 'url', 'file_path', 'html', 'identifier')
+
     def __init__(self, task: ScrapeJobTask, scrape_job_type: ScrapeJobType, url: str = '', file_path: str = '', html: str = '', identifier: str = ''):
         self.task = task
         self.scrape_job_type = scrape_job_type
@@ -20,4 +23,4 @@ class ScrapeJob:
         self.identifier = identifier
 
     def __repr__(self):
-        return str(self.__dict__)
+        return str({attr: getattr(self, attr) for attr in self.__slots__})
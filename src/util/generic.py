@@ -1,6 +1,7 @@
+import re
 import sys
 from enum import Enum
-from typing import Tuple, Optional, Any, List, NamedTuple, Callable, Union
+from typing import Tuple, Optional, Any, List, NamedTuple, Callable, Union, Dict
 
 
 class KeyValuePair(NamedTuple):
@@ -124,5 +125,14 @@ def replace_with_index(s: str, replacement: str, start: int = 0, end: int = -1)
     return s[:start] + replacement + s[end + 1:]
 
 
+def multi_replace(s: str, mapping: Dict[str, str]) -> str:
+    if not mapping:
+        return s
+
+    pattern = re.compile('|'.join(re.escape(key) for key in sorted(mapping, key=len, reverse=True)))
+
+    return pattern.sub(lambda match: mapping[match.group(0)], s)
+
+
 def is_blank(s: str) -> bool:
     return not s or s.isspace()
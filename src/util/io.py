@@ -1,22 +1,28 @@
 import hashlib
 import os
+import threading
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
-from typing import Tuple, Optional, List
+from typing import Tuple, Optional, List, Union, Dict
 
 from charset_normalizer import CharsetNormalizerMatches
 
 from src.util.generic import is_blank, LogType, log
 
 # Retrieved and modified from https://referencesource.microsoft.com/#mscorlib/system/io/path.cs,090eca8621a248ee
-INVALID_PATH_CHARACTERS = ['\"', '<', '>', '|', '\0', '*', '?'] + \
-                          [chr(i) for i in range(1, 32)]
+INVALID_PATH_CHARACTERS = ('\"', '<', '>', '|', '\0', '*', '?') + \
+                          tuple(chr(i) for i in range(1, 32))
 
-INVALID_FILENAME_CHARACTERS = ['\"', '<', '>', '|', '\0', ':', '*', '?', '\\', '/'] + \
-                              [chr(i) for i in range(1, 32)]
+INVALID_FILENAME_CHARACTERS = ('\"', '<', '>', '|', '\0', ':', '*', '?', '\\', '/') + \
+                              tuple(chr(i) for i in range(1, 32))
 
 DEFAULT_MAX_FILENAME_LENGTH = 80
 
+# Download workers move files concurrently, choosing the final name and renaming onto it has to happen as one step per directory
+MOVE_FILE_LOCKS_LOCK = threading.Lock()
+MOVE_FILE_LOCKS: Dict[str, threading.Lock] = {}
+
 
 class DuplicateHandler(Enum):
     FIND_VALID_FILE = 'FIND_VALID_FILE'
@@ -72,18 +78,17 @@ def get_file_extension(s: str, fatal=False, include_ext_period: bool = False) ->
     return split_filename(s, fatal=fatal, include_ext_period=include_ext_period)[1]
 
 
-def replace_invalid_path_characters(path: str, replacement: str = '') -> str:
-    for char in INVALID_PATH_CHARACTERS:
-        path = path.replace(char, replacement)
+@lru_cache(maxsize=16)
+def get_translation_table(characters: Tuple[str, ...], replacement: str) -> Dict[int, str]:
+    return str.maketrans(dict.fromkeys(characters, replacement))
 
-    return path
 
+def replace_invalid_path_characters(path: str, replacement: str = '') -> str:
+    return path.translate(get_translation_table(INVALID_PATH_CHARACTERS, replacement))
 
-def replace_invalid_filename_characters(filename: str, replacement: str = '') -> str:
-    for char in INVALID_FILENAME_CHARACTERS:
-        filename = filename.replace(char, replacement)
 
-    return filename
+def replace_invalid_filename_characters(filename: str, replacement: str = '') -> str:
+    return filename.translate(get_translation_table(INVALID_FILENAME_CHARACTERS, replacement))
 
 
 def split_full_path(full_path: str) -> Tuple[str, str]:
@@ -228,10 +233,45 @@ def move_file_same_dir(old: str, new: str, make_dirs: bool = True, duplicate_han
     return move_file(old, new_file, make_dirs=make_dirs, duplicate_handler=duplicate_handler)
 
 
-def move_file(old: str, new: str, make_dirs: bool = True, duplicate_handler: DuplicateHandler = None) -> str:
+def move_file(old: str, new: str, make_dirs: bool = True, duplicate_handler: DuplicateHandler = None, old_hash: str = None) -> str:
+    """
+    :param old_hash: SHA-1 of old if the caller already has it, saves reading the file again for DuplicateHandler.HASH_COMPARE
+    """
     if make_dirs:
         os.makedirs(Path(new).parent, exist_ok=True)
 
+    while True:
+        # Hashing happens outside the directory lock, which is only held while the final name is reserved and renamed onto
+        new_checked = False
+        if duplicate_handler == DuplicateHandler.HASH_COMPARE and Path(new).exists():
+            new_checked = True
+
+            # Files of different sizes cannot match, only hash when they could
+            if os.path.getsize(old) == os.path.getsize(new):
+                old_hash = old_hash or get_sha1_hash_file(old)
+                if old_hash == get_sha1_hash_file(new):
+                    return new
+
+        with get_move_file_lock(new):
+            # Another worker took the name while this one was hashing, compare against that file first
+            if duplicate_handler == DuplicateHandler.HASH_COMPARE and not new_checked and Path(new).exists():
+                continue
+
+            return move_file_impl(old, new, duplicate_handler=duplicate_handler)
+
+
+def get_move_file_lock(path: str) -> threading.Lock:
+    directory = str(Path(path).parent.resolve())
+
+    with MOVE_FILE_LOCKS_LOCK:
+        lock = MOVE_FILE_LOCKS.get(directory)
+        if lock is None:
+            lock = MOVE_FILE_LOCKS[directory] = threading.Lock()
+
+        return lock
+
+
+def move_file_impl(old: str, new: str, duplicate_handler: DuplicateHandler = None) -> str:
     if duplicate_handler and Path(new).exists():
         if duplicate_handler == DuplicateHandler.FIND_VALID_FILE:
             new = get_valid_filename(new)
@@ -242,12 +282,7 @@ def move_file(old: str, new: str, make_dirs: bool = True, duplicate_handler: Dup
         elif duplicate_handler == DuplicateHandler.SKIP:
             return new
         elif duplicate_handler == DuplicateHandler.HASH_COMPARE:
-            old_file = get_sha1_hash_file(old)
-            new_file = get_sha1_hash_file(new)
-
-            if old_file == new_file:
-                return new
-
+            # move_file already compared against the file at new
             new = get_valid_filename(new)
 
     file = str(Path(old).rename(new)).replace('\\', '/')
@@ -255,11 +290,14 @@ def move_file(old: str, new: str, make_dirs: bool = True, duplicate_handler: Dup
     return file
 
 
-def write_file(path: str, text: str, filename: str = '', encoding: Optional[str] = None):
+def write_file(path: str, text: Union[str, bytes], filename: str = '', encoding: Optional[str] = None):
     if filename:
         path = join_path(path, filename=filename)
 
-    Path(path).write_text(text, encoding=encoding)
+    if isinstance(text, bytes):
+        Path(path).write_bytes(text)
+    else:
+        Path(path).write_text(text, encoding=encoding)
 
 
 def append_to_file(path: str, text: str, filename: str = '', encoding: Optional[str] = None):
@@ -1,6 +1,7 @@
 import inspect
 from enum import Enum
-from typing import List, get_origin, get_args, Any
+from functools import lru_cache, partial
+from typing import List, get_origin, get_args, Any, Callable, NamedTuple, Tuple, Dict
 
 from src.util.generic import log, first_or_none, LogType
 
@@ -17,10 +18,13 @@ PRIMITIVE_TYPES = [
     type(None),
 ]
 
+JSON_MISSING = object()
+
 
 def json_parse(json, key, default=None, fatal=False):
-    if key in json:
-        return json[key]
+    val = json.get(key, JSON_MISSING)
+    if val is not JSON_MISSING:
+        return val
 
     if fatal:
         log(f'Cannot find {key} in {json}.', log_type=LogType.ERROR)
@@ -28,51 +32,100 @@ def json_parse(json, key, default=None, fatal=False):
     return default
 
 
+def json_parse_path(json, *keys, default=None, fatal=False):
+    val = json
+    for key in keys:
+        val = val.get(key, JSON_MISSING)
+        if val is JSON_MISSING:
+            if fatal:
+                log(f'Cannot find {"/".join(keys)} in {json}.', log_type=LogType.ERROR)
+
+            return default
+
+    return val
+
+
+@lru_cache(maxsize=None)
+def get_enum_index(class_type: type) -> Dict[str, Any]:
+    if issubclass(class_type, Enum):
+        return {name.upper(): member for name, member in class_type.__members__.items()}
+
+    return {name.upper(): val for name, val in class_type.__dict__.items() if not name.startswith('_')}
+
+
 def json_parse_enum(obj, json_val, class_type, fatal=False):
     val = json_parse(obj, json_val, default=None, fatal=fatal)
 
+    return parse_enum(val, class_type)
+
+
+def parse_enum(val, class_type):
     if not val:
         return None
 
-    val = str(val).upper()
-    if val not in class_type.__dict__.keys():
-        log(f'Invalid Enum: {val}, Keys: {class_type.__dict__.keys()}', log_type=LogType.ERROR)
+    index = get_enum_index(class_type)
 
-    return class_type.__dict__[val]
+    member = index.get(str(val).upper())
+    if member is None:
+        log(f'Invalid Enum: {val}, Keys: {list(index.keys())}', log_type=LogType.ERROR)
 
+    return member
 
-def json_parse_class(json: dict, class_type: type):
+
+class ClassField(NamedTuple):
+    arg: str
+    json_key: str
+    parse: Callable[[dict, str], Any]
+
+
+def json_parse_primitive(json: dict, key: str):
+    return json[key]
+
+
+def json_parse_nested_class(json: dict, key: str, class_type: type):
+    return json_parse_class(json[key], class_type)
+
+
+def json_parse_nested_class_list(json: dict, key: str, class_type: type):
+    return json_parse_class_list(json[key], class_type, fatal=True)
+
+
+@lru_cache(maxsize=None)
+def get_class_fields(class_type: type) -> Tuple[ClassField, ...]:
     signature = inspect.signature(class_type.__init__)
-    args = signature.parameters.keys()
-    args = [arg for arg in args if arg != 'self']
+    args = [arg for arg in signature.parameters.keys() if arg != 'self']
 
-    d = {}
+    class_fields = []
     for arg in args:
         arg_type = signature.parameters[arg].annotation
-
-        if arg in SAFE_PARAMETER_MAPPING:
-            temp_arg = SAFE_PARAMETER_MAPPING[arg]
-        else:
-            temp_arg = arg
-
-        if temp_arg not in json:
-            continue
+        json_key = SAFE_PARAMETER_MAPPING.get(arg, arg)
 
         if arg_type in PRIMITIVE_TYPES:
-            generated_arg_obj = json[temp_arg]
-        elif issubclass(arg_type, Enum):
-            generated_arg_obj = json_parse_enum(json, temp_arg, arg_type, fatal=True)
+            parse = json_parse_primitive
         elif get_origin(arg_type) and get_origin(arg_type) == list:
             list_type = first_or_none(get_args(arg_type))
 
             if not list_type:
                 log(f'List Type {arg_type} was None, origin: {get_origin(arg_type)}', log_type=LogType.ERROR)
 
-            generated_arg_obj = json_parse_class_list(json[temp_arg], list_type, fatal=True)
+            parse = partial(json_parse_nested_class_list, class_type=list_type)
+        elif issubclass(arg_type, Enum):
+            parse = partial(json_parse_enum, class_type=arg_type, fatal=True)
         else:
-            generated_arg_obj = json_parse_class(json[temp_arg], arg_type)
+            parse = partial(json_parse_nested_class, class_type=arg_type)
+
+        class_fields.append(ClassField(arg, json_key, parse))
+
+    return tuple(class_fields)
+
+
+def json_parse_class(json: dict, class_type: type):
+    d = {}
+    for arg, json_key, parse in get_class_fields(class_type):
+        if json_key not in json:
+            continue
 
-        d[arg] = generated_arg_obj
+        d[arg] = parse(json, json_key)
 
     obj = class_type(**d)
 
@@ -1,6 +1,10 @@
-from collections import MutableSet, OrderedDict
+import heapq
+from collections import OrderedDict
+from collections.abc import MutableSet
 from enum import Enum
+from itertools import count
 from queue import Queue
+from typing import List, Tuple, Any
 
 
 # Retrieved and modified from https://stackoverflow.com/a/1653978
@@ -10,7 +14,7 @@ class OrderedSet(OrderedDict, MutableSet):
         return key
 
     def pop_last(self):
-        key, _ = self.popitem(last=False)
+        key, _ = self.popitem(last=True)
         return key
 
     def update(self, *args, **kwargs):
@@ -59,6 +63,7 @@ class OrderedSet(OrderedDict, MutableSet):
 class QueueType(Enum):
     FIFO = 'FIFO',
     LIFO = 'LIFO'
+    PRIORITY = 'PRIORITY'
 
 
 class OrderedSetQueue(Queue):
@@ -70,14 +75,32 @@ class OrderedSetQueue(Queue):
     def _init(self, maxsize: int):
         self.queue: OrderedSet = OrderedSet()
 
+        # Only used by QueueType.PRIORITY, the counter keeps items with equal priority in insertion order
+        self.heap: List[Tuple[float, int, Any]] = []
+        self.counter = count()
+
     def _put(self, item):
+        if self.queue_type != QueueType.PRIORITY:
+            self.queue.add(item)
+            return
+
+        priority, item = item
+        if item in self.queue:
+            return
+
         self.queue.add(item)
+        heapq.heappush(self.heap, (priority, next(self.counter), item))
 
     def _get(self):
         if self.queue_type == QueueType.FIFO:
             return self.queue.pop_first()
-        else:
+        elif self.queue_type == QueueType.LIFO:
             return self.queue.pop_last()
+        else:
+            _, _, item = heapq.heappop(self.heap)
+            self.queue.discard(item)
+
+            return item
 
     def _qsize(self):
         return len(self.queue)
@@ -85,12 +108,38 @@ class OrderedSetQueue(Queue):
     def dequeue(self):
         return self.get()
 
-    def enqueue(self, item):
-        self.put(item)
-
-    def enqueue_list(self, lst):
-        for elem in lst:
-            self.put(elem)
+    def enqueue(self, item, priority: float = 0):
+        """
+        Lower priorities are dequeued first, the priority is ignored unless the queue is a QueueType.PRIORITY queue.
+        """
+        self.put((priority, item) if self.queue_type == QueueType.PRIORITY else item)
+
+    def enqueue_list(self, lst, priority: float = 0, priorities: List[float] = None):
+        """
+        If given, priorities holds one priority per item in lst and takes precedence over priority.
+        """
+        if priorities is None:
+            priorities = [priority] * len(lst)
+
+        if self.maxsize > 0:
+            for elem, elem_priority in zip(lst, priorities):
+                self.enqueue(elem, priority=elem_priority)
+
+            return
+
+        # Unbounded queue, so the whole list can be added under one lock acquisition
+        with self.mutex:
+            size = len(self.queue)
+            if self.queue_type == QueueType.PRIORITY:
+                for elem, elem_priority in zip(lst, priorities):
+                    self._put((elem_priority, elem))
+            else:
+                self.queue.update(lst)
+
+            added = len(self.queue) - size
+            if added:
+                self.unfinished_tasks += added
+                self.not_empty.notify(added)
 
     def __repr__(self):
         return self.queue.__repr__()
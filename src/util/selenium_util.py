@@ -1,15 +1,17 @@
+from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 from time import sleep
-from typing import Optional
+from typing import Optional, List, Tuple, Dict
 
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions
 from selenium.webdriver.support.wait import WebDriverWait
 
-from src.util.generic import log, LogType
+from src.util.generic import log, LogType, first_or_none
 from src.util.web.generic import is_url_exact
 
 
@@ -18,23 +20,46 @@ class UITask(Enum):
     CLICK = 1
 
 
+@dataclass(frozen=True)
 class UIElement:
-    def __init__(self, identifier: str, ui_type: By, value: str = None, task: UITask = None):
-        self.identifier = identifier
-        self.ui_type = ui_type
-        self.value = value
-        self.task = task
+    identifier: str
+    ui_type: By
+    value: str = None
+    task: UITask = None
 
-    def __repr__(self):
-        return str(self.__dict__)
 
+DRIVER_WAITS_ATTRIBUTE = 'ripper_waits'
+DEFAULT_POLL_FREQUENCY = 0.5
 
-def get_ui_element(driver: WebDriver, element: UIElement, timeout=30, fatal=True) -> Optional[WebElement]:
-    specifier = (element.ui_type, element.identifier)
+PAGE_LOAD_TIMEOUT = 30
+MAX_NAVIGATION_ATTEMPTS = 5
+PAGE_LOAD_POLL_FREQUENCY = 0.05
+
+
+def get_driver_wait(driver: WebDriver, timeout: float, poll_frequency: float = DEFAULT_POLL_FREQUENCY) -> WebDriverWait:
+    # Stored on the driver itself since each WebDriverWait holds a reference back to its driver
+    waits: Dict[Tuple[float, float], WebDriverWait] = getattr(driver, DRIVER_WAITS_ATTRIBUTE, None)
+    if waits is None:
+        waits = {}
+        setattr(driver, DRIVER_WAITS_ATTRIBUTE, waits)
+
+    key = (timeout, poll_frequency)
+    wait = waits.get(key)
+    if wait is None:
+        wait = waits[key] = WebDriverWait(driver, timeout, poll_frequency=poll_frequency)
+
+    return wait
 
+
+@lru_cache(maxsize=None)
+def get_visibility_condition(ui_type: By, identifier: str):
+    return expected_conditions.visibility_of_element_located((ui_type, identifier))
+
+
+def get_ui_element(driver: WebDriver, element: UIElement, timeout=30, fatal=True) -> Optional[WebElement]:
     try:
-        wait = WebDriverWait(driver, timeout)
-        found_element = wait.until(expected_conditions.visibility_of_element_located(specifier))
+        wait = get_driver_wait(driver, timeout)
+        found_element = wait.until(get_visibility_condition(element.ui_type, element.identifier))
 
         return found_element
     except TimeoutException:
@@ -44,49 +69,102 @@ def get_ui_element(driver: WebDriver, element: UIElement, timeout=30, fatal=True
             return None
 
 
-def driver_go_and_wait(driver: WebDriver, url: str, scroll_pause_time: float, fail: int = 0):
-    if fail >= 5:
-        log(f'URL does not ever match, {url} never becomes {driver.current_url}', log_type=LogType.ERROR)
+FIND_SCRIPT_TEXT_JS = '''
+    for (const script of document.scripts) {
+        if (script.innerHTML.includes(arguments[0])) {
+            return script.innerHTML;
+        }
+    }
 
-    driver.get(url)
-    wait_page_load(driver)
+    return null;
+'''
+
+
+def find_script_text(driver: WebDriver, substring: str) -> Optional[str]:
+    try:
+        return driver.execute_script(FIND_SCRIPT_TEXT_JS, substring)
+    except WebDriverException as e:
+        log(e, extra='Could not search scripts in page, falling back to per-element lookup', fatal=False, log_type=LogType.ERROR)
+
+    scripts = [script.get_attribute('innerHTML') for script in driver.find_elements_by_tag_name('script')]
+    return first_or_none(scripts, lambda element: substring in element)
+
+
+GET_ELEMENTS_ATTRIBUTE_JS = '''
+    return Array.from(document.getElementsByTagName(arguments[0]), element => {
+        const source = arguments[2] ? element.getElementsByTagName(arguments[2])[0] : element;
+        if (!source) {
+            return null;
+        }
+
+        const value = source[arguments[1]];
+        const attribute = typeof value === 'string' ? value : source.getAttribute(arguments[1]);
 
-    if not is_url_exact(driver.current_url, url):
-        driver_go_and_wait(driver, url, scroll_pause_time, fail=fail + 1)
+        return attribute ? [attribute, null] : [attribute, element.outerHTML];
+    });
+'''
+
+
+def get_elements_attribute(driver: WebDriver, tag: str, attribute: str, child_tag: str = None) -> List[Optional[Tuple[Optional[str], Optional[str]]]]:
+    """
+    Entries are None when child_tag is given and the element has no such child.
+    """
+    return [tuple(pair) if pair else None for pair in driver.execute_script(GET_ELEMENTS_ATTRIBUTE_JS, tag, attribute, child_tag)]
+
+
+def driver_go_and_wait(driver: WebDriver, url: str, scroll_pause_time: float, max_attempts: int = MAX_NAVIGATION_ATTEMPTS):
+    for _ in range(max_attempts):
+        driver.get(url)
+        wait_page_load(driver)
+
+        if is_url_exact(driver.current_url, url):
+            break
+    else:
+        log(f'URL does not ever match, {url} never becomes {driver.current_url}', log_type=LogType.ERROR)
 
     scroll_to_bottom(driver, scroll_pause_time=scroll_pause_time)
 
 
-def wait_page_load(driver: WebDriver):
-    page_state = driver.execute_script('return document.readyState;')
+def is_page_loaded(driver: WebDriver) -> bool:
+    return driver.execute_script('return document.readyState;') == 'complete'
 
-    while page_state != 'complete':
-        sleep(1)
+
+def wait_page_load(driver: WebDriver, timeout: float = PAGE_LOAD_TIMEOUT):
+    try:
+        get_driver_wait(driver, timeout, poll_frequency=PAGE_LOAD_POLL_FREQUENCY).until(is_page_loaded)
+    except TimeoutException:
+        log(f'Page did not finish loading within {timeout}s: {driver.current_url}', fatal=False, log_type=LogType.ERROR)
 
 
 def wait_page_redirect(driver: WebDriver, current_url: str):
-    wait = WebDriverWait(driver, 10)
+    wait = get_driver_wait(driver, 10)
     wait.until(expected_conditions.url_changes(current_url))
 
     wait_page_load(driver)
 
 
-def scroll_to_bottom(driver: WebDriver, scroll_pause_time: float = 1.0):
-    last_height = driver.execute_script('return document.body.scrollHeight - document.documentElement.scrollTop;')
+# An instant scroll has already moved when the script returns, so the remaining height it reports is current
+SCROLL_BY_JS = '''
+    window.scrollBy({
+      top: window.innerHeight - 10,
+      left: 0,
+      behavior: 'instant'
+    });
 
-    while True:
-        driver.execute_script('''
-            window.scrollBy({
-              top: window.innerHeight - 10,
-              left: 0,
-              behavior: 'smooth'
-            });
-        ''')
+    return document.body.scrollHeight - document.documentElement.scrollTop;
+'''
+REMAINING_SCROLL_HEIGHT_JS = 'return document.body.scrollHeight - document.documentElement.scrollTop;'
 
-        sleep(scroll_pause_time)
 
-        new_height = driver.execute_script('return document.body.scrollHeight - document.documentElement.scrollTop;')
+def scroll_to_bottom(driver: WebDriver, scroll_pause_time: float = 1.0):
+    last_height = driver.execute_script(REMAINING_SCROLL_HEIGHT_JS)
+
+    while True:
+        new_height = driver.execute_script(SCROLL_BY_JS)
         if new_height == last_height:
             break
 
         last_height = new_height
+
+        # Gives lazily loaded content time to extend the page before the next scroll checks for movement
+        sleep(scroll_pause_time)
@@ -0,0 +1,113 @@
+import atexit
+import threading
+from time import monotonic
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.util.url_store import URLStore, URLState
+
+DEFAULT_FLUSH_INTERVAL = 128
+DEFAULT_FLUSH_SECONDS = 5.0
+
+
+class URLCache:
+    """
+    Set of URLs per base URL kept in memory and written back to a URLStore in batches. Every URL carries an insertion sequence number, so the
+    original order survives a restart.
+    """
+    def __init__(self, store: URLStore, state: URLState, flush_interval: int = DEFAULT_FLUSH_INTERVAL, flush_seconds: float = DEFAULT_FLUSH_SECONDS):
+        self.store = store
+        self.state = state
+        self.flush_interval = flush_interval
+        self.flush_seconds = flush_seconds
+        self.lock = threading.RLock()
+
+        self.urls: Dict[str, Dict[str, int]] = {}
+        self.pending: Dict[Tuple[str, str], Optional[int]] = {}
+        self.sequence = 0
+        self.last_flush = monotonic()
+        self.closed = False
+
+        self.load()
+
+        atexit.register(self.close)
+
+    def load(self):
+        entries = self.store.load(self.state)
+
+        for base_url, url, sequence in entries:
+            self.urls.setdefault(base_url, {})[url] = sequence
+
+        self.sequence = entries[-1][2] + 1 if entries else 0
+
+    def add(self, url: str, base_url: str):
+        with self.lock:
+            urls = self.urls.setdefault(base_url, {})
+            if url in urls:
+                return
+
+            urls[url] = self.sequence
+            self.mark_changed(base_url, url, self.sequence)
+            self.sequence += 1
+
+    def add_list(self, lst: Iterable[str], base_url: str):
+        with self.lock:
+            urls = self.urls.setdefault(base_url, {})
+            for url in lst:
+                if url in urls:
+                    continue
+
+                urls[url] = self.sequence
+                self.pending[(base_url, url)] = self.sequence
+                self.sequence += 1
+
+            self.flush_if_needed()
+
+    def discard(self, url: str, base_url: str):
+        with self.lock:
+            urls = self.urls.get(base_url)
+            if not urls or url not in urls:
+                return
+
+            del urls[url]
+            self.mark_changed(base_url, url, None)
+
+    def contains(self, url: str, base_url: str) -> bool:
+        with self.lock:
+            return url in self.urls.get(base_url, ())
+
+    def get(self, base_url: str) -> List[str]:
+        with self.lock:
+            return list(self.urls.get(base_url, ()))
+
+    def filter_missing(self, urls: Iterable[str], base_url: str) -> List[str]:
+        with self.lock:
+            existing = self.urls.get(base_url, ())
+
+            return [url for url in urls if url not in existing]
+
+    def mark_changed(self, base_url: str, url: str, sequence: Optional[int]):
+        self.pending[(base_url, url)] = sequence
+        self.flush_if_needed()
+
+    def flush_if_needed(self):
+        if len(self.pending) >= self.flush_interval or monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                added = [(base_url, url, sequence) for (base_url, url), sequence in self.pending.items() if sequence is not None]
+                removed = [key for key, sequence in self.pending.items() if sequence is None]
+
+                self.store.write(self.state, added, removed)
+
+            self.pending.clear()
+            self.last_flush = monotonic()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+
+            self.flush()
+            self.closed = True
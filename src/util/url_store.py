@@ -0,0 +1,85 @@
+import atexit
+import dbm
+import shelve
+import sqlite3
+import threading
+from enum import Enum
+from typing import List, Tuple, Iterable
+
+from src.util.generic import log, LogType
+
+URL_STORE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+)
+
+URL_STORE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS urls (
+        state INTEGER NOT NULL,
+        base_url TEXT NOT NULL,
+        url TEXT NOT NULL,
+        sequence INTEGER NOT NULL,
+        PRIMARY KEY (state, base_url, url)
+    ) WITHOUT ROWID
+'''
+
+class URLState(Enum):
+    QUEUED = 0
+    COMPLETED = 1
+
+
+class URLStore:
+    def __init__(self, file: str):
+        self.lock = threading.Lock()
+
+        # Writes are serialized by self.lock, so the connection can be shared between the scraping threads
+        self.connection = sqlite3.connect(file, isolation_level=None, check_same_thread=False)
+        for pragma in URL_STORE_PRAGMAS:
+            self.connection.execute(pragma)
+
+        self.created = not self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'urls'").fetchone()
+        self.connection.execute(URL_STORE_SCHEMA)
+
+        atexit.register(self.close)
+
+    def load(self, state: URLState) -> List[Tuple[str, str, int]]:
+        with self.lock:
+            cursor = self.connection.execute('SELECT base_url, url, sequence FROM urls WHERE state = ? ORDER BY sequence', (state.value,))
+
+            return cursor.fetchall()
+
+    def write(self, state: URLState, added: Iterable[Tuple[str, str, int]], removed: Iterable[Tuple[str, str]]):
+        with self.lock, self.connection:
+            self.connection.execute('BEGIN')
+            self.connection.executemany('INSERT OR REPLACE INTO urls (state, base_url, url, sequence) VALUES (?, ?, ?, ?)',
+                                        ((state.value, base_url, url, sequence) for base_url, url, sequence in added))
+            self.connection.executemany('DELETE FROM urls WHERE state = ? AND base_url = ? AND url = ?',
+                                        ((state.value, base_url, url) for base_url, url in removed))
+
+    def import_shelve(self, file: str, state: URLState):
+        """
+        Copies a URL cache written by older versions, which stored a list of URLs per base URL.
+        """
+        if not dbm.whichdb(file):
+            return
+
+        added = []
+        try:
+            with shelve.open(file, flag='r') as shelf:
+                for base_url in shelf:
+                    for url in shelf[base_url]:
+                        added.append((base_url, url, len(added)))
+        except Exception as e:
+            log(e, extra=f'Could not import URL cache {file}', fatal=False, log_type=LogType.ERROR)
+            return
+
+        self.write(state, added, [])
+
+    def close(self):
+        with self.lock:
+            if self.connection is None:
+                return
+
+            self.connection.close()
+            self.connection = None
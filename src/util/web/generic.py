@@ -1,21 +1,28 @@
-import json
+import atexit
+import hashlib
 import os
 import re
 import shelve
 import tempfile
-import urllib.request
+import threading
 from enum import Enum
+from functools import lru_cache
 from http.client import HTTPMessage
 from pathlib import Path
 from queue import LifoQueue
-from typing import List, Tuple, Optional, Union, Any
+from types import MappingProxyType
+from typing import List, Tuple, Optional, Union, Any, Dict, Collection, Set, Mapping
 from typing.io import IO
-from urllib.error import HTTPError
-from urllib.parse import urlparse, ParseResult, urldefrag
+from urllib.parse import urlparse, urldefrag
 
+import orjson
+import requests
 import validators
 from filetype import filetype
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
 from tldextract import tldextract
+from urllib3.util.retry import Retry
 
 from src.util.generic import find_nth, is_blank, first_or_none, name_of, find_nth_reverse, LogType, log
 from src.util.io import DEFAULT_MAX_FILENAME_LENGTH, join_path, shorten_file_name, move_file, split_path_components, join_filename_with_ext, \
@@ -27,6 +34,12 @@ URL_REGEX = re.compile(r'[=:] *(?:\'([^\']*)\'|"([^"]*)")| *\(([^()]*)\)')
 RELATIVE_URL_REGEX = re.compile(r'^(?!www\.|(?:http|ftp)s?://|[A-Za-z]:\\|//).*')
 
 CACHE_WEBSITE_LINKS_FILE = 'cache/website_links.db'
+URL_CACHE_SIZE = 8192
+
+CONTENT_TYPE_CACHE: Dict[str, str] = {}
+
+DOWNLOAD_CACHE_LOCK = threading.RLock()
+DOWNLOAD_CACHE: Optional[shelve.Shelf] = None
 
 DEFAULT_HEADERS = [
     ('Accept', '*/*'),
@@ -34,6 +47,27 @@ DEFAULT_HEADERS = [
     ('User-Agent', 'website-ripper/1.0')
 ]
 
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+HTTP_POOL_CONNECTIONS = 32
+HTTP_POOL_MAXSIZE = 64
+HTTP_MAX_RETRIES = 3
+HTTP_RETRY_BACKOFF_FACTOR = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+HTTP_SESSION_LOCK = threading.Lock()
+HTTP_SESSION: Optional[requests.Session] = None
+
+# (connect, read) timeout for every request, a stalled host would otherwise pin a worker and its host semaphore forever
+HTTP_TIMEOUT: Tuple[float, float] = (10.0, 10.0)
+
+# Caps concurrent requests to a single host across all page and download workers
+HOST_MAX_CONNECTIONS = 8
+HOST_SEMAPHORES_LOCK = threading.Lock()
+HOST_SEMAPHORES: Dict[str, threading.BoundedSemaphore] = {}
+
+# Older download cache entries still hold urllib's HTTPMessage
+ResponseHeaders = Union[CaseInsensitiveDict, HTTPMessage]
+
 
 class GroupByPair:
     def __init__(self, extensions: List[str], folder: str):
@@ -49,12 +83,22 @@ class GroupByMapping:
         self.pairs = list(pairs)
         self.fail_dir = fail_dir
 
+        index: Dict[str, str] = {}
+        for pair in self.pairs:
+            for extension in pair.extensions:
+                index.setdefault(extension.lower(), pair.folder)
+
+        # Shared by every download worker, so it is frozen once built
+        self.index: Mapping[str, str] = MappingProxyType(index)
+
     def __contains__(self, item: str) -> bool:
-        return any(item in pair.extensions for pair in self.pairs)
+        return item.lower() in self.index
 
     def __getitem__(self, item: str) -> str:
-        val: GroupByPair = first_or_none([pair for pair in self.pairs if item in pair.extensions])
-        return val.folder
+        return self.index[item.lower()]
+
+    def get_folder(self, extension: str) -> str:
+        return self.index.get(extension.lower(), self.fail_dir)
 
     def __repr__(self):
         return str(self.__dict__)
@@ -67,7 +111,7 @@ class DownloadedFileResult(Enum):
 
 
 class DownloadedFile:
-    def __init__(self, filename: str = '', url: str = '', headers: Optional[HTTPMessage] = None, result: DownloadedFileResult = DownloadedFileResult.FAIL):
+    def __init__(self, filename: str = '', url: str = '', headers: Optional[ResponseHeaders] = None, result: DownloadedFileResult = DownloadedFileResult.FAIL):
         self.filename = filename.replace('\\', '/') if filename else ''
         self.url = url
         self.headers = headers
@@ -159,6 +203,7 @@ def extract_json_from_text(s: str):
     return json
 
 
+@lru_cache(maxsize=URL_CACHE_SIZE)
 def get_pure_domain(base_url: str) -> str:
     extract = tldextract.extract(base_url)
     pure_domain = extract.domain + '.' + extract.suffix
@@ -229,23 +274,6 @@ def get_sub_directory_path(base_url: str, new_url: str, prepend_dir: str = None,
     return sub_dir
 
 
-def url_in_list_parsed(parsed_url: ParseResult, lst: List[ParseResult]) -> bool:
-    parsed_url_path = '' if parsed_url.path == '/' else parsed_url.path
-
-    for elem in lst:
-        elem_path = '' if elem.path == '/' else elem.path
-
-        same = parsed_url_path == elem_path and \
-               parsed_url.netloc == elem.netloc and \
-               parsed_url.params == elem.params and \
-               parsed_url.query == elem.query
-
-        if same:
-            return True
-
-    return False
-
-
 def get_url_without_fragment(url: str) -> Optional[str]:
     if not url:
         return None
@@ -255,13 +283,23 @@ def get_url_without_fragment(url: str) -> Optional[str]:
     return base
 
 
-def url_in_list(url: str, lst: List[ParseResult], fragments: bool = True) -> bool:
-    parsed_url = urlparse(url, allow_fragments=fragments)
-    return url_in_list_parsed(parsed_url, lst)
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def get_url_key(url: str) -> str:
+    parsed_url = urlparse(url)
+
+    return parsed_url._replace(scheme='', netloc=parsed_url.netloc.lower(), path=parsed_url.path.rstrip('/'), fragment='').geturl()
+
 
+def get_url_depth(url: str) -> int:
+    return sum(1 for component in urlparse(url).path.split('/') if component)
 
-def is_url_exact(u1: str, u2: str) -> True:
-    return url_in_list(u1, [urlparse(u2)])
+
+def url_in_list(url: str, url_keys: Set[str]) -> bool:
+    return get_url_key(url) in url_keys
+
+
+def is_url_exact(u1: str, u2: str) -> bool:
+    return get_url_key(u1) == get_url_key(u2)
 
 
 def join_url(url: str, *paths: str):
@@ -298,6 +336,7 @@ def url_in_domain(base_url, url):
     return pure_domain in url or RELATIVE_URL_REGEX.search(url)
 
 
+@lru_cache(maxsize=URL_CACHE_SIZE)
 def get_base_url(domain: str) -> str:
     parsed = urlparse(domain)
 
@@ -309,34 +348,75 @@ def get_base_url(domain: str) -> str:
     return base_url
 
 
+@lru_cache(maxsize=URL_CACHE_SIZE)
 def get_referer(s: str):
     return s[:find_nth(s, '/', 3) + 1]
 
 
+@lru_cache(maxsize=URL_CACHE_SIZE)
 def get_origin(s: str) -> str:
     return s[:find_nth(s, '/', 3)]
 
 
-def configure_urllib_opener(headers: List[Tuple[str, str]], use_default_headers: bool = True):
-    http_handler = urllib.request.HTTPHandler()
-    http_handler.set_http_debuglevel(1)
+def get_http_session() -> requests.Session:
+    global HTTP_SESSION
+
+    with HTTP_SESSION_LOCK:
+        if HTTP_SESSION is None:
+            session = requests.Session()
+            session.headers.clear()
+            session.headers.update(DEFAULT_HEADERS)
+
+            # Transient failures are retried on the pooled connection, the final response is still checked by raise_for_status
+            retry = Retry(total=HTTP_MAX_RETRIES, backoff_factor=HTTP_RETRY_BACKOFF_FACTOR, status_forcelist=HTTP_RETRY_STATUSES,
+                          allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
 
-    https_handler = urllib.request.HTTPSHandler()
-    https_handler.set_http_debuglevel(1)
+            HTTP_SESSION = session
 
-    opener = urllib.request.build_opener()  # http_handler, https_handler)
+        return HTTP_SESSION
 
-    if use_default_headers:
-        for default_header in DEFAULT_HEADERS:
-            opener.addheaders.append(default_header)
 
-    if headers:
-        opener.addheaders = headers
+def get_host_semaphore(url: str) -> threading.BoundedSemaphore:
+    host = urlparse(url).netloc.lower()
 
-    urllib.request.install_opener(opener)
+    with HOST_SEMAPHORES_LOCK:
+        semaphore = HOST_SEMAPHORES.get(host)
+        if semaphore is None:
+            semaphore = HOST_SEMAPHORES[host] = threading.BoundedSemaphore(HOST_MAX_CONNECTIONS)
 
+        return semaphore
 
-def ignorable_content_type(ignored_content_types: List[str], content_type: str, attempt_download_on_fail: bool = True) -> bool:
+
+def http_get(url: str, headers: List[Tuple[str, str]] = None, stream: bool = False) -> requests.Response:
+    # A streamed body is read after this returns, so streaming callers hold the host semaphore themselves
+    if stream:
+        response = get_http_session().get(url, headers=dict(headers) if headers else None, stream=True, timeout=HTTP_TIMEOUT)
+    else:
+        with get_host_semaphore(url):
+            response = get_http_session().get(url, headers=dict(headers) if headers else None, timeout=HTTP_TIMEOUT)
+
+    try:
+        response.raise_for_status()
+    except:
+        # Releases the pooled connection of an unread streamed body
+        response.close()
+        raise
+
+    return response
+
+
+def get_response_text(response: requests.Response) -> str:
+    # requests assumes ISO-8859-1 for text/* without a charset, keep utf-8 as the fallback instead
+    if 'charset' not in response.headers.get('Content-Type', '').lower():
+        response.encoding = 'utf-8'
+
+    return response.text
+
+
+def ignorable_content_type(ignored_content_types: Collection[str], content_type: str, attempt_download_on_fail: bool = True) -> bool:
     if not ignored_content_types or len(ignored_content_types) == 0:
         return False
 
@@ -354,38 +434,56 @@ def ignorable_content_type(ignored_content_types: List[str], content_type: str,
 
 # noinspection DuplicatedCode
 def download_to_json(url: str, headers: List[Tuple[str, str]] = None) -> dict:
-    if headers:
-        configure_urllib_opener(headers)
-
-    response = urllib.request.urlopen(url)
-    charset = response.info().get_param('charset') or 'utf-8'
-    data = response.read().decode(charset)
-    json_obj = json.loads(data)
+    response = http_get(url, headers=headers)
+    data = get_response_text(response)
+    json_obj = orjson.loads(data)
 
     return json_obj
 
 
 # noinspection DuplicatedCode
 def download_to_str(url: str, headers: List[Tuple[str, str]] = None) -> str:
-    if headers:
-        configure_urllib_opener(headers)
-
-    response = urllib.request.urlopen(url)
-    charset = response.info().get_param('charset') or 'utf-8'
-    data = response.read().decode(charset)
+    response = http_get(url, headers=headers)
+    data = get_response_text(response)
 
     return data
 
 
-def add_to_download_cache(download_cache, *urls, headers: HTTPMessage = None, filename: str = None, result=DownloadedFileResult.SUCCESS) \
+def get_download_cache() -> shelve.Shelf:
+    global DOWNLOAD_CACHE
+
+    with DOWNLOAD_CACHE_LOCK:
+        if DOWNLOAD_CACHE is None:
+            DOWNLOAD_CACHE = shelve.open(CACHE_WEBSITE_LINKS_FILE)
+            atexit.register(DOWNLOAD_CACHE.close)
+
+        return DOWNLOAD_CACHE
+
+
+def get_from_download_cache(download_cache: shelve.Shelf, url: str) -> Optional[DownloadedFile]:
+    with DOWNLOAD_CACHE_LOCK:
+        return download_cache.get(url)
+
+
+def is_cached_download_valid(downloaded_file: Optional[DownloadedFile]) -> bool:
+    if not downloaded_file:
+        return False
+
+    return downloaded_file.result != DownloadedFileResult.SUCCESS or os.path.isfile(downloaded_file.filename)
+
+
+def add_to_download_cache(download_cache, *urls, headers: ResponseHeaders = None, filename: str = None, result=DownloadedFileResult.SUCCESS) \
         -> Optional[DownloadedFile]:
     if len(urls) == 0:
         log(f'Cache fail, no url sent.', log_type=LogType.ERROR)
 
     downloaded_file = DownloadedFile(filename=filename, url=urls[0], headers=headers, result=result)
 
-    for url in urls:
-        download_cache[url] = downloaded_file
+    with DOWNLOAD_CACHE_LOCK:
+        for url in urls:
+            download_cache[url] = downloaded_file
+
+        download_cache.sync()
 
     return downloaded_file
 
@@ -411,40 +509,30 @@ def get_content_type_from_header(content_type: str):
     return content_type
 
 
-def get_content_type_from_headers(res_headers: HTTPMessage):
+def get_content_type_from_headers(res_headers: ResponseHeaders):
     if not res_headers:
         return None
 
-    content_type: str = res_headers.get('Content-Type', failobj=None)
+    content_type: str = res_headers.get('Content-Type', None)
 
     return get_content_type_from_header(content_type)
 
 
-def is_url_valid(url: str, headers: List[Tuple[str, str]] = None) -> True:
-    configure_urllib_opener(headers)
-
+def is_url_valid(url: str, headers: List[Tuple[str, str]] = None) -> bool:
     try:
-        code = urllib.request.urlopen(url)
-
-        return code == 200
+        with get_host_semaphore(url), http_get(url, headers=headers, stream=True) as response:
+            return response.status_code == 200
     except:
         return False
 
 
-def get_content_type_head(url: str):
+def get_content_type_head(url: str, headers: List[Tuple[str, str]] = None):
     try:
-        req = urllib.request.Request(url, method='HEAD')
-        with urllib.request.urlopen(req) as response:
-            res_headers: HTTPMessage = response.info()
-
-            content_type = get_content_type_from_headers(res_headers)
-    except HTTPError as e:
-        if e and e.headers:
-            content_type_tmp = e.headers.get('Content-Type', None)
-            content_type = get_content_type_from_header(content_type_tmp)
-        else:
-            log(e, extra=f'URL: {url}', fatal=False, log_type=LogType.ERROR)
-            content_type = None
+        # Error responses are kept as well, their Content-Type is still the best guess without downloading
+        with get_host_semaphore(url):
+            response = get_http_session().head(url, headers=dict(headers) if headers else None, allow_redirects=True, timeout=HTTP_TIMEOUT)
+
+        content_type = get_content_type_from_headers(response.headers)
     except Exception as e:
         log(e, extra=f'General Exception URL: {url}', fatal=False, log_type=LogType.ERROR)
         content_type = None
@@ -452,9 +540,9 @@ def get_content_type_head(url: str):
     return content_type
 
 
-def get_content_type_get(url: str, with_progress_bar: bool = True):
+def get_content_type_get(url: str, headers: List[Tuple[str, str]] = None, with_progress_bar: bool = True):
     filename = tempfile.TemporaryFile(delete=False).name
-    file_download = download_file_impl(url, filename, download_cache=None, with_progress_bar=with_progress_bar)
+    file_download = download_file_impl(url, filename, download_cache=None, headers=headers, with_progress_bar=with_progress_bar)
 
     if not file_download:
         return None
@@ -462,7 +550,7 @@ def get_content_type_get(url: str, with_progress_bar: bool = True):
     if type(file_download) == DownloadedFile:
         res_headers = file_download.headers
     else:
-        _, _, res_headers = file_download
+        _, _, res_headers, _ = file_download
 
     content_type = get_content_type_from_headers(res_headers)
 
@@ -470,8 +558,7 @@ def get_content_type_get(url: str, with_progress_bar: bool = True):
 
 
 def get_content_type_cache(url: str):
-    download_cache = shelve.open(CACHE_WEBSITE_LINKS_FILE, writeback=True)
-    cached = download_cache.get(url, default=None)
+    cached = get_from_download_cache(get_download_cache(), url)
 
     if not cached:
         return None
@@ -484,23 +571,23 @@ def get_content_type_cache(url: str):
 
 def get_content_type(url: str, headers: List[Tuple[str, str]] = None, with_progress_bar: bool = True, cache: bool = True) -> Optional[str]:
     if cache:
-        check_cached = get_content_type_cache(url)
+        check_cached = CONTENT_TYPE_CACHE.get(url) or get_content_type_cache(url)
 
         if check_cached:
+            CONTENT_TYPE_CACHE[url] = check_cached
             return check_cached
 
-    configure_urllib_opener(headers)
-
-    check_head = get_content_type_head(url)
+    content_type = get_content_type_head(url, headers=headers) or get_content_type_get(url, headers=headers, with_progress_bar=with_progress_bar)
 
-    if check_head:
-        return check_head
+    if content_type:
+        CONTENT_TYPE_CACHE[url] = content_type
 
-    return get_content_type_get(url, with_progress_bar=with_progress_bar)
+    return content_type
 
 
 def find_urls_in_html_or_js(html: str) -> List[Tuple[Optional[str], Optional[str]]]:
     lst = []
+    seen = set()
     matches = URL_REGEX.findall(html)
     for match in matches:
         url: Optional[str] = first_or_none(match)
@@ -518,31 +605,33 @@ def find_urls_in_html_or_js(html: str) -> List[Tuple[Optional[str], Optional[str
             url = 'https:' + url
             valid = True
 
-        if valid and url not in lst:
+        if valid and url not in seen:
+            seen.add(url)
             lst.append((url, original_url))
 
     return lst
 
 
 def read_url_utf8(url: str) -> str:
-    data: bytes = urllib.request.urlopen(url).read()
+    data: bytes = http_get(url).content
     s = data.decode('utf-8')
 
     return s
 
 
 def download_file(url: str, ideal_filename: str = None, out_dir: str = None, headers: List[Tuple[str, str]] = None, with_progress_bar: bool = True,
-                  cache: bool = True, duplicate_handler: DuplicateHandler = DuplicateHandler.FIND_VALID_FILE, ignored_content_types: List[str] = None,
+                  cache: bool = True, duplicate_handler: DuplicateHandler = DuplicateHandler.FIND_VALID_FILE, ignored_content_types: Collection[str] = None,
                   max_filename_length=DEFAULT_MAX_FILENAME_LENGTH, group_by: GroupByMapping = None) -> DownloadedFile:
-    download_cache = shelve.open(CACHE_WEBSITE_LINKS_FILE, writeback=True)
+    download_cache = get_download_cache()
 
-    if cache and url in download_cache:
-        return download_cache[url]
+    if cache:
+        cached = get_from_download_cache(download_cache, url)
 
-    configure_urllib_opener(headers)
+        if is_cached_download_valid(cached):
+            return cached
 
     filename = tempfile.TemporaryFile(delete=False).name
-    file_download = download_file_impl(url, filename, download_cache, with_progress_bar=with_progress_bar)
+    file_download = download_file_impl(url, filename, download_cache, headers=headers, with_progress_bar=with_progress_bar)
 
     if not file_download:
         downloaded_file = add_to_download_cache(download_cache, url, result=DownloadedFileResult.FAIL)
@@ -555,7 +644,7 @@ def download_file(url: str, ideal_filename: str = None, out_dir: str = None, hea
         downloaded_file = add_to_download_cache(download_cache, url, result=DownloadedFileResult.FAIL)
         return downloaded_file
 
-    url, old_url, res_headers = file_download
+    url, old_url, res_headers, file_hash = file_download
 
     content_type = get_content_type_from_headers(res_headers)
     if ignorable_content_type(ignored_content_types, content_type):
@@ -563,7 +652,7 @@ def download_file(url: str, ideal_filename: str = None, out_dir: str = None, hea
         return downloaded_file
 
     actual_name = None
-    content_disposition = res_headers.get('Content-Disposition', failobj=None)
+    content_disposition = res_headers.get('Content-Disposition', None)
     if content_disposition:
         result = re.findall('filename="(.+)"', content_disposition)
         result = first_or_none(result)
@@ -621,95 +710,102 @@ def download_file(url: str, ideal_filename: str = None, out_dir: str = None, hea
     if out_dir and group_by:
         directory, filename_only, ext = split_path_components(out_path, fatal=False, include_ext_period=True)
 
-        sub_dir = f'/{group_by.fail_dir}'
-        if ext in group_by:
-            sub_dir = f'/{group_by[ext]}'
+        sub_dir = f'/{group_by.get_folder(ext)}'
 
         filename_with_ext = join_filename_with_ext(filename_only, ext)
         out_path = join_path(directory, sub_dir, filename=filename_with_ext)
 
     out_path = shorten_file_name(out_path, max_length=max_filename_length)
-    filename = move_file(filename, out_path, make_dirs=True, duplicate_handler=duplicate_handler)
+    filename = move_file(filename, out_path, make_dirs=True, duplicate_handler=duplicate_handler, old_hash=file_hash)
     downloaded_file = add_to_download_cache(download_cache, url, old_url, headers=res_headers, filename=filename)
 
-    download_cache.close()  # synchronizes automatically
-
     return downloaded_file
 
 
-def download_file_stream(url: str, file_stream: IO, block_size: int = 1024 * 8, with_progress_bar: bool = True, fatal: bool = True) -> bool:
-    try:
-        download_stream = urllib.request.urlopen(url)
-    except Exception as e:
-        log(f'Failed on: {url}', fatal=False, log_type=LogType.ERROR)
-        log(e, fatal=fatal, log_type=LogType.ERROR)
-        return False
+def download_file_stream(url: str, file_stream: IO, block_size: int = DOWNLOAD_BLOCK_SIZE, with_progress_bar: bool = True, fatal: bool = True,
+                         headers: List[Tuple[str, str]] = None) -> bool:
+    with get_host_semaphore(url):
+        try:
+            download_stream = http_get(url, headers=headers, stream=True)
+        except Exception as e:
+            log(f'Failed on: {url}', fatal=False, log_type=LogType.ERROR)
+            log(e, fatal=fatal, log_type=LogType.ERROR)
+            return False
 
-    with download_stream:
-        res_headers: HTTPMessage = download_stream.info()
-        total_size = int(res_headers.get('Content-Length', failobj=0))
+        with download_stream:
+            res_headers: CaseInsensitiveDict = download_stream.headers
+            total_size = int(res_headers.get('Content-Length', 0))
 
-        progress_bar = None
-        if with_progress_bar and total_size > 0:
-            progress_bar = DownloadProgressBar(total_size)
+            progress_bar = None
+            if with_progress_bar and total_size > 0:
+                progress_bar = DownloadProgressBar(total_size)
 
-        read = 0
-        while True:
-            block: bytes = download_stream.read(block_size)
-            if not block:
-                break
+            read = 0
+            for block in download_stream.iter_content(block_size):
+                read += len(block)
+                file_stream.write(block)
 
-            read += len(block)
-            file_stream.write(block)
+                if progress_bar:
+                    progress_bar.run(len(block))
 
-            if progress_bar and not progress_bar.run(len(block)):
-                break
+            if progress_bar:
+                progress_bar.close()
 
-        if total_size >= 0 and read < total_size:
-            return False
+            if total_size >= 0 and read < total_size:
+                return False
 
-    return True
+        return True
 
 
-def download_file_impl(url: str, filename: str, download_cache: Optional[shelve.DbfilenameShelf], block_size: int = 1024 * 8, with_progress_bar: bool = True) \
-        -> Union[Tuple[str, str, HTTPMessage], DownloadedFile, None]:
-    try:
-        download_stream = urllib.request.urlopen(url)
-    except:
-        return None
+def download_file_impl(url: str, filename: str, download_cache: Optional[shelve.Shelf], block_size: int = DOWNLOAD_BLOCK_SIZE, with_progress_bar: bool = True,
+                       headers: List[Tuple[str, str]] = None) -> Union[Tuple[str, str, CaseInsensitiveDict, str], DownloadedFile, None]:
+    """
+    :return: The final URL, the original URL if it redirected, the response headers and the SHA-1 of the body, or a valid cached download
+    """
+    with get_host_semaphore(url):
+        try:
+            download_stream = http_get(url, headers=headers, stream=True)
+        except:
+            return None
 
-    old_url: str = ''
-    with download_stream:
-        res_headers: HTTPMessage = download_stream.info()
-        new_url: str = download_stream.geturl()
+        old_url: str = ''
+        with download_stream:
+            res_headers: CaseInsensitiveDict = download_stream.headers
+            new_url: str = download_stream.url
 
-        if download_cache and new_url in download_cache:
-            return download_cache[new_url]
+            if download_cache is not None:
+                cached = get_from_download_cache(download_cache, new_url)
 
-        if url != new_url:
-            old_url = url
-            url = new_url
+                if is_cached_download_valid(cached):
+                    return cached
 
-        total_size = int(res_headers.get('Content-Length', failobj=0))
+            if url != new_url:
+                old_url = url
+                url = new_url
 
-        progress_bar = None
-        if with_progress_bar and total_size > 0:
-            progress_bar = DownloadProgressBar(total_size, on_complete=lambda x: log(f'Downloaded {url} to {filename}'))
+            total_size = int(res_headers.get('Content-Length', 0))
 
-        read = 0
-        with open(filename, 'w+b') as file_stream:
-            while True:
-                block: bytes = download_stream.read(block_size)
-                if not block:
-                    break
+            progress_bar = None
+            if with_progress_bar and total_size > 0:
+                progress_bar = DownloadProgressBar(total_size, on_complete=lambda x: log(f'Downloaded {url} to {filename}'))
 
-                read += len(block)
-                file_stream.write(block)
+            # Hashed while streaming so DuplicateHandler.HASH_COMPARE does not have to read the file back
+            sha1 = hashlib.sha1()
+            read = 0
+            with open(filename, 'w+b') as file_stream:
+                for block in download_stream.iter_content(block_size):
+                    read += len(block)
+                    file_stream.write(block)
+                    sha1.update(block)
+
+                    if progress_bar:
+                        progress_bar.run(len(block))
 
-                if progress_bar and not progress_bar.run(len(block)):
-                    break
+            if progress_bar:
+                progress_bar.close()
 
-        if total_size >= 0 and read < total_size:
-            log(f'File download incomplete, received {read} out of {total_size} bytes. URL: {url}, filename: {filename}', fatal=False, log_type=LogType.ERROR)
+            if total_size >= 0 and read < total_size:
+                log(f'File download incomplete, received {read} out of {total_size} bytes. URL: {url}, filename: {filename}', fatal=False,
+                    log_type=LogType.ERROR)
 
-    return url, old_url, res_headers
+        return url, old_url, res_headers, sha1.hexdigest()
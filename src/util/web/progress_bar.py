@@ -2,11 +2,17 @@ from typing import Callable
 
 from tqdm import tqdm
 
+DEFAULT_UPDATE_INTERVAL = 256 * 1024
+
 
 class DownloadProgressBar:
-    def __init__(self, total_size: int = 0, min_leave_size: int = 1024 * 1024 * 1, on_complete: Callable[[int], None] = None):
+    def __init__(self, total_size: int = 0, min_leave_size: int = 1024 * 1024 * 1, on_complete: Callable[[int], None] = None,
+                 update_interval: int = DEFAULT_UPDATE_INTERVAL):
         self.total_size = total_size
         self.on_complete = on_complete
+        self.update_interval = update_interval
+        self.pending = 0
+        self.closed = False
 
         leave = True
         if self.total_size and self.total_size < min_leave_size:
@@ -14,15 +20,40 @@ class DownloadProgressBar:
 
         self.progress_bar = tqdm(total=total_size, unit='iB', unit_scale=True, leave=leave)
 
+    def flush(self):
+        # Decoded (gzip/deflate) bodies can be longer than Content-Length, the bar is only clamped for display
+        if self.pending and self.progress_bar.n < self.total_size:
+            self.progress_bar.update(min(self.pending, self.total_size - self.progress_bar.n))
+
+        self.pending = 0
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.flush()
+
+        if self.progress_bar.n == 0:
+            self.progress_bar.leave = False
+
+        self.progress_bar.close()
+        self.closed = True
+
     def run(self, byte_count: int) -> bool:
-        if self.progress_bar.n < self.total_size:
-            self.progress_bar.update(byte_count)
+        """
+        :return: False once the bar is full, callers should still read the response to the end
+        """
+        if self.closed:
+            return False
 
-        if self.total_size != 0 and self.progress_bar.n == self.total_size:
-            if self.progress_bar.n == 0:
-                self.progress_bar.leave = False
+        self.pending += byte_count
+        if self.pending < self.update_interval and self.progress_bar.n + self.pending < self.total_size:
+            return True
 
-            self.progress_bar.close()
+        self.flush()
+
+        if self.total_size != 0 and self.progress_bar.n == self.total_size:
+            self.close()
 
             if self.on_complete and self.progress_bar.leave:
                 pass  # self.on_complete(self.total_size)
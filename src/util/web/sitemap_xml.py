@@ -7,14 +7,18 @@ from src.util.generic import is_blank
 from src.util.web.generic import get_base_url, read_url_utf8
 from src.util.web.robots_txt import RobotsTxt
 
+# https://www.sitemaps.org/protocol.html#prioritydef
+DEFAULT_PRIORITY = 0.5
+
 
 class SitemapXmlURL:
-    def __init__(self, url: str, last_modified: datetime):
+    def __init__(self, url: str, last_modified: datetime, priority: float = DEFAULT_PRIORITY):
         self.url = url
         self.last_modified = last_modified
+        self.priority = priority
 
     def __repr__(self):
-        return f'SitemapXmlURL([URL: {self.url}, Last Modified: {self.last_modified}])'
+        return f'SitemapXmlURL([URL: {self.url}, Last Modified: {self.last_modified}, Priority: {self.priority}])'
 
 
 class SitemapXml:
@@ -70,7 +74,16 @@ class SitemapXml:
             if not is_blank(last_modified_str):
                 last_modified = datetime.fromisoformat(last_modified_str)
 
-            sitemap_url = SitemapXmlURL(url=loc, last_modified=last_modified)
+            priority_str: Optional[str] = SitemapXml.get_element_by_end_str(url, 'priority')
+
+            priority = DEFAULT_PRIORITY
+            if not is_blank(priority_str):
+                try:
+                    priority = float(priority_str)
+                except ValueError:
+                    pass
+
+            sitemap_url = SitemapXmlURL(url=loc, last_modified=last_modified, priority=priority)
             sitemap.add_url(sitemap_url)
 
         return sitemap
@@ -1,6 +1,6 @@
-import json
 from typing import Optional, List, TYPE_CHECKING
 
+import orjson
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.remote.webelement import WebElement
 
@@ -73,7 +73,7 @@ class WistiaVideoHandler(VideoHandler):
         text = text[text.index('='):]
 
         json_str = extract_json_from_text(text)
-        json_obj = json.loads(json_str)
+        json_obj = orjson.loads(json_str)
 
         script = WistiaVideoHandler.parse_json(json_obj)
 